@@ -3,6 +3,8 @@
 '''
 RPistepper is a library containing:
     * A class to control a stepper motor with a RPi.
+    * A class to move several motors together in coordinated lines.
+    * A class to batch the GPIO writes of several motors.
     * A function to execute a zig-zag motion with two motors.
     * A function to execute a square_spiral motion with two motors.
 
@@ -24,8 +26,18 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 #______________________________________________________________________
 # imports
-import RPi.GPIO as GPIO
+from array import array
+from collections import namedtuple
+from itertools import cycle, islice
+from math import sqrt
+import threading
 from time import sleep
+from .timing import NS, SleepTimer, HybridTimer
+from .profiles import Constant, Trapezoidal, SCurve, Blend
+from . import trajectory
+from .instrument import StepRecorder
+from .backends import (get_backend, set_backend, mask, RPiGPIOBackend,
+    SimulatedBackend, MMapBackend)
 
 #______________________________________________________________________
 # version
@@ -33,17 +45,260 @@ __version__ = '0.3a0'
 
 #______________________________________________________________________
 # globals
-m0 = [2, 3, 4, 17],
-m1 = [14, 15, 18, 23],
-m2 = [27, 22, 10, 9],
-m3 = [24, 25, 8, 7],
-m4 = [11, 0, 5, 6],
-m5 = [1, 12, 16, 20],
+m0 = [2, 3, 4, 17]
+m1 = [14, 15, 18, 23]
+m2 = [27, 22, 10, 9]
+m3 = [24, 25, 8, 7]
+m4 = [11, 0, 5, 6]
+m5 = [1, 12, 16, 20]
 m6 = [13, 19, 26, 21]
 
+#______________________________________________________________________
+# move reports
+MoveStats = namedtuple('MoveStats',
+    ['steps', 'elapsed', 'late', 'max_lateness', 'target_rate', 'rate',
+    'end'])
+
+StopStats = namedtuple('StopStats',
+    ['latency', 'hard', 'decel_steps', 'skipped_steps'])
+
+def _report(schedule, start, finish, late, max_lateness):
+    '''
+    Builds the MoveStats report of a move that followed 'schedule' from
+    'start' and finished at 'finish' (ns). 'end' in the report is the
+    scheduled end of the move, where a following move may start
+    '''
+    duration = schedule.end/NS
+    elapsed = (finish - start)/NS
+    target_rate = schedule.steps/duration if duration else float('inf')
+    rate = schedule.steps/elapsed if elapsed > 0 else float('inf')
+    return MoveStats(schedule.steps, elapsed, late, max_lateness,
+        target_rate, rate, start + schedule.end)
+
+class _Schedule(object):
+    '''
+    Iterates over the step offsets of a move of 'owner' (a Motor or a
+    MotorGroup) with 'profile' checking for stop requests before each
+    step. When a stop is requested the remaining steps are replaced by
+    the tail of the stop, and self.steps, self.end and self.stopped are
+    updated.
+    '''
+    def __init__(self, owner, profile, steps):
+        self.owner = owner
+        self.offsets = profile.schedule(steps)
+        # profiles without acceleration (Constant) halt at once
+        self.acceleration = getattr(profile, 'acceleration', None)
+        self.steps = len(self.offsets) - 1
+        self.end = self.offsets[-1]
+        self.stopped = None
+
+    def __iter__(self):
+        owner = self.owner
+        offsets = self.offsets
+        for n in range(self.steps):
+            if owner._stop is not None:
+                for offset in self._stopping(n):
+                    yield offset
+                return
+            yield offsets[n]
+
+    def _stopping(self, n):
+        '''
+        Returns the offsets of the steps left after a stop observed
+        when 'n' steps were written. A hard stop halts at once, a soft
+        stop decelerates from the current step period at the
+        acceleration of the profile, whatever the speed the move
+        started at
+        '''
+        requested, hard, release = self.owner._stop
+        latency = self.owner.timer.now() - requested
+        offsets = self.offsets
+        count = self.steps
+        tail = []
+        end = offsets[n - 1] if n else 0
+        a = self.acceleration
+        if not hard and n and a:
+            speed = NS/(offsets[n] - offsets[n - 1])
+            # steps until the speed reaches 0, x = v^2/(2a)
+            decel = min(int(speed*speed/(2*a)), count - n)
+            base = end
+            for x in range(1, decel + 1):
+                tail.append(base + int((speed - sqrt(max(speed*speed - 2*a*x,
+                    0)))/a*NS))
+            end = max(base + int(speed/a*NS), tail[-1] if tail else base)
+        self.steps = n + len(tail)
+        self.end = end
+        self.stopped = StopStats(latency/NS, hard, len(tail),
+            count - n - len(tail))
+        return tail
+
+async def _sleep_until(now, deadline):
+    '''
+    Sleeps on the event loop until 'deadline', in the time of the
+    clock 'now'. Yields to the loop even if the deadline has passed
+    '''
+    # asyncio is slow to import, it's only loaded by the coroutines
+    import asyncio
+    await asyncio.sleep(max(deadline - now(), 0)/NS)
+
 #______________________________________________________________________
 # classes
-class Motor(object):
+class _Pending(threading.local):
+    '''
+    Pending set/clear bitmasks and 'with' depth of a Bank, one per
+    thread
+    '''
+    def __init__(self):
+        self.set = 0
+        self.clear = 0
+        self.deferred = 0
+
+class Bank(object):
+    '''
+    This class collects the pending coil states of several motors as
+    set/clear bitmasks and writes them in a single GPIO call with
+    self.flush().
+
+    Motors created with a bank stage their writes in it. Outside a
+    'with' block each write is flushed immediately, inside the block
+    the writes are deferred and flushed together when it ends:
+        with bank:
+            motor1.lock()
+            motor2.lock()
+
+    All the motors of a bank must use its backend. A bank may be shared
+    by motors moving on different threads: each thread has its own
+    pending pins, a 'with' block defers the writes of its thread until
+    it ends and self.flush() writes the pins of the calling thread. The
+    GPIO calls hold self.lock.
+    '''
+
+    #__________________________________________________________________
+    # magic methods
+    def __init__(self, backend=None):
+        '''
+        The argument is the GPIO backend, it defaults to the backend
+        returned by get_backend()
+        '''
+        self.backend = backend if backend is not None else get_backend()
+        self.lock = threading.Lock()
+        self._pending = _Pending()
+
+    def __repr__(self):
+        pending = self._pending
+        return 'Bank with {0} pending pins'.format(
+            bin(pending.set | pending.clear).count('1'))
+
+    def __enter__(self):
+        self._pending.deferred += 1
+        return self
+
+    def __exit__(self, type, value, tb):
+        pending = self._pending
+        pending.deferred -= 1
+        if not pending.deferred:
+            self._flush(pending)
+
+    #__________________________________________________________________
+    # methods
+    def stage(self, set_mask, clear_mask):
+        '''
+        Stages the pins in the bitmask 'set_mask' to be set and the
+        pins in 'clear_mask' to be cleared on the next flush
+        '''
+        pending = self._pending
+        pending.set = pending.set & ~clear_mask | set_mask
+        pending.clear = pending.clear & ~set_mask | clear_mask
+        if not pending.deferred:
+            self._flush(pending)
+
+    def flush(self):
+        '''
+        Writes the pending pins of the calling thread in a single GPIO
+        call
+        '''
+        self._flush(self._pending)
+
+    #__________________________________________________________________
+    # private methods
+    def _flush(self, pending):
+        if pending.set | pending.clear:
+            set_mask, clear_mask = pending.set, pending.clear
+            pending.set = pending.clear = 0
+            self._write(set_mask, clear_mask)
+
+    def _write(self, set_mask, clear_mask):
+        with self.lock:
+            self.backend.write(set_mask, clear_mask)
+
+class _Stoppable(object):
+    '''
+    Stop requests shared by Motor and MotorGroup. The moves poll
+    self._stop through a _Schedule. A move is marked as moving before
+    its schedule is built, so no stop request is lost while it's being
+    built, and an Executor arms the motor before it runs a command, so
+    the stop requests made from then on are kept for its moves.
+    '''
+    _stop = None
+    _moving = False
+    _armed = False
+    last_stop = None
+
+    def stop(self, hard=False, release=False):
+        '''
+        Stops the move in progress. It may be called from any thread,
+        the move sees the request before its next step. A soft stop
+        decelerates along the profile of the move, a hard stop halts at
+        once. With 'release' the coils are released after the stop.
+        self.steps remains accurate, the StopStats report with the
+        latency of the stop is kept in self.last_stop
+        '''
+        if self._moving:
+            self._stop = (self.timer.now(), hard, release)
+        elif release:
+            self.release()
+
+    def _arm(self):
+        '''
+        Marks the start of a command that moves, clearing old stop
+        requests
+        '''
+        self._stop = None
+        self._armed = True
+        self._moving = True
+
+    def _disarm(self):
+        '''
+        Marks the end of a command that moves
+        '''
+        self._armed = False
+        self._moving = False
+        self._stop = None
+
+    def _start_move(self):
+        '''
+        Marks the start of a move, clearing old stop requests unless it
+        was armed
+        '''
+        if not self._moving:
+            self._stop = None
+            self._moving = True
+        self._log(True)
+
+    def _end_move(self, schedule):
+        '''
+        Marks the end of a move, handling its stop request. 'schedule'
+        is None if the move failed before it was scheduled
+        '''
+        self._moving = self._armed
+        if schedule is not None and schedule.stopped is not None:
+            self.last_stop = schedule.stopped
+            if self._stop[2]:
+                self.release()
+        self._stop = None
+        self._log()
+
+class Motor(_Stoppable):
     '''
     This class allows the user to control a 6 pin stepper motor using
     4 GPIO pins of a RPi.
@@ -59,29 +314,70 @@ class Motor(object):
 
     In order to save power, it's advised to call self.release() when
     the motor is idle.
+
+    When DEADLINE is set (default), each step n of a move fires at the
+    absolute deadline t0 + n*DELAY instead of sleeping DELAY after each
+    write, so the loop overhead does not accumulate over long moves.
+    The report of the last move is kept in self.last_move.
+
+    The deadlines are kept by self.timer, a HybridTimer by default,
+    which sleeps and then busy-waits the last stretch before each
+    deadline. Use a SleepTimer to save CPU on slow motors.
+
+    Moves run at the constant DELAY unless a motion profile (see
+    RPistepper.profiles) is given to self.move or set in self.PROFILE.
+
+    Motors sharing a Bank can batch their writes in a single GPIO call.
+
+    The pins are driven by a backend (see RPistepper.backends), the
+    RPi.GPIO library unless another one is given or set as default.
+
+    The steps are compiled into a waveform, an array with the set
+    bitmask of the pins of each step, when the pins are assigned.
+
+    self.move_async, self.reset_async and self.zero_async are asyncio
+    coroutines equivalent to the blocking methods, they wait for each
+    step deadline on the event loop.
+
+    self.stop() interrupts a move from any thread within one step
+    period, the report of the stop is kept in self.last_stop.
+
+    Set self.recorder to a StepRecorder (see RPistepper.instrument) to
+    record the scheduled and actual time of every step.
+
+    With a Journal (see RPistepper.journal) the motor records its
+    position at the start and end of each move and recovers it when
+    created, self.recovered tells if it did.
+
+    self.lost is True when the position is unknown, after a path run
+    that was interrupted (see RPistepper.planner). self.zero() sets a
+    new reference and clears it.
     '''
 
     #__________________________________________________________________
     # class attributes
     DELAY = 0.02
     VERBOSE = False
+    DEADLINE = True
+    TOLERANCE = 0.00005
+    TIMER = HybridTimer()
+    PROFILE = None
 
     #__________________________________________________________________
     # magic methods
-    def __init__(self, pins, delay=DELAY, verbose=VERBOSE):
+    def __init__(self, pins, delay=DELAY, verbose=VERBOSE, deadline=DEADLINE,
+            timer=TIMER, profile=PROFILE, bank=None, backend=None,
+            journal=None, name=None):
         '''
         Arguments are a list with the 4 pins (Coil_A1, Coil_A2,
-        Coil_B1, Coil_B2), the delay between steps (default = 20ms) and
-        verbose to display reports on the motor movements, the last two
-        are optional.
+        Coil_B1, Coil_B2), the delay between steps (default = 20ms),
+        verbose to display reports on the motor movements, deadline
+        to schedule the steps at absolute deadlines, the timer used
+        to wait for them, the default motion profile, the Bank that
+        batches the writes, the GPIO backend, the Journal that keeps
+        the position and the name of the motor in the journal (default
+        = the pins), the last nine are optional.
         '''
-        self.PINS = pins
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.PINS, GPIO.OUT)
-        self.DELAY = delay
-        self.VERBOSE = verbose
-        self.actual_state = []
-        self.locked = False
         self._step_list = [
             (1, 1, 0, 0),
             (1, 0, 1, 0),
@@ -89,10 +385,38 @@ class Motor(object):
             (0, 1, 0, 1),
             (0, 0, 1, 1),
             (1, 0, 0, 1)]
+        self.PINS = pins
+        if backend is None:
+            backend = bank.backend if bank is not None else get_backend()
+        if bank is not None and bank.backend is not backend:
+            raise ValueError('The motor and its bank must share the backend')
+        self.backend = backend
+        self.backend.setup(self.PINS)
+        self.DELAY = delay
+        self.VERBOSE = verbose
+        self.DEADLINE = deadline
+        self.timer = timer
+        self.PROFILE = profile
+        self.bank = bank
+        self.actual_state = []
+        self.locked = False
+        self.last_move = None
+        self.recorder = None
+        self.lost = False
+        self.journal = journal
+        self.name = name if name is not None else ','.join(
+            str(pin) for pin in pins)
         self._release_all = [0]*4
         self._steps = 0
-        self._set_step(self._step_list[0])
-        self.release()
+        position = journal.recover(self.name) if journal is not None else None
+        self.recovered = position is not None and not position.moving
+        if self.recovered:
+            self._steps = position.steps
+        self._set_step(self._step_list[self._steps%len(self._step_list)])
+        if self.recovered and position.locked:
+            self.lock()
+        else:
+            self.release()
 
     def __repr__(self):
         return 'Motor at pins: {0}, Steps: {1}, Position: {2}'.format(
@@ -106,6 +430,20 @@ class Motor(object):
 
     #__________________________________________________________________
     # properties
+    @property
+    def PINS(self):
+        '''
+        The 4 pins (Coil_A1, Coil_A2, Coil_B1, Coil_B2) of the motor
+        '''
+        return self._pins
+
+    @PINS.setter
+    def PINS(self, pins):
+        self._pins = pins
+        self._pins_mask = mask(pins, [0]*len(pins))[1]
+        self._waveform = array('L',
+            [mask(pins, states)[0] for states in self._step_list])
+
     @property
     def steps(self):
         '''
@@ -120,22 +458,34 @@ class Motor(object):
 
     #__________________________________________________________________
     # methods
-    def move(self, steps):
+    def move(self, steps, profile=None, start=None):
         '''
         Moves the motor 'steps' steps. Negative steps moves the motor
-        backwards
+        backwards. 'profile' is the motion profile of the move, it
+        defaults to self.PROFILE or to a constant DELAY between steps.
+        'start' is the deadline of the first step in the time of
+        self.timer, it defaults to now, pass the 'end' of the report
+        of the previous move to chain moves without a gap.
+        Returns a MoveStats report, also stored in self.last_move.
         '''
         if steps == 0:
             return
         if self.VERBOSE:
             print(str(self)+ ', Moving: {0} steps'.format(steps))
         rotation = steps//abs(steps)
-        for i in range(0, steps, rotation):
-            index = (self._steps + rotation)%len(self._step_list)
-            self._set_step(self._step_list[index])
-            sleep(self.DELAY)
-            self._steps += rotation
-        self.locked = True
+        self._start_move()
+        schedule = None
+        try:
+            schedule = _Schedule(self, self._profile(profile), steps)
+            if self.DEADLINE:
+                stats = self._move_deadline(schedule, rotation, start)
+            else:
+                stats = self._move_sleep(schedule, rotation)
+            self.locked = True
+        finally:
+            self._end_move(schedule)
+        self.last_move = stats
+        return stats
 
     def release(self):
         '''
@@ -144,6 +494,7 @@ class Motor(object):
         self._set_step(self._release_all)
         self.actual_state = self._release_all
         self.locked = False
+        self._log()
 
     def lock(self):
         '''
@@ -152,6 +503,7 @@ class Motor(object):
         index = (self._steps)%len(self._step_list)
         self._set_step(self._step_list[index])
         self.locked = True
+        self._log()
 
     def reset(self):
         '''
@@ -166,6 +518,7 @@ class Motor(object):
         are on. Sets this position as the reference (steps = 0).
         '''
         self._steps = 0
+        self.lost = False
         self.steps = 6
         self.steps = 0
         self.locked = True
@@ -174,16 +527,365 @@ class Motor(object):
         '''
         Cleans the GPIO resources
         '''
-        GPIO.cleanup(self.PINS)
+        self.backend.cleanup(self.PINS)
+
+    #__________________________________________________________________
+    # coroutines
+    async def move_async(self, steps, profile=None):
+        '''
+        Coroutine version of self.move. Control goes back to the event
+        loop between steps. If the task is cancelled the motor stops
+        locked at the last step written, with self.steps up to date.
+        '''
+        if steps == 0:
+            return
+        if self.VERBOSE:
+            print(str(self)+ ', Moving: {0} steps'.format(steps))
+        rotation = steps//abs(steps)
+        write = self._write
+        tolerance = int(self.TOLERANCE*NS)
+        now = self.timer.now
+        record = self.recorder.record if self.recorder is not None else None
+        late = 0
+        max_lateness = 0
+        self._start_move()
+        schedule = None
+        try:
+            schedule = _Schedule(self, self._profile(profile), steps)
+            start = now()
+            for offset, (set_mask, clear_mask) in zip(schedule,
+                    self._phases(rotation, schedule.steps)):
+                deadline = start + offset
+                await _sleep_until(now, deadline)
+                actual = now()
+                if record is not None:
+                    record(deadline, actual)
+                lateness = actual - deadline
+                if lateness > tolerance:
+                    late += 1
+                    max_lateness = max(max_lateness, lateness)
+                write(set_mask, clear_mask)
+                self._steps += rotation
+            await _sleep_until(now, start + schedule.end)
+        finally:
+            self._sync_state()
+            self.locked = True
+            self._end_move(schedule)
+        self.last_move = _report(schedule, start, now(), late,
+            max_lateness/NS)
+        return self.last_move
+
+    async def reset_async(self):
+        '''
+        Coroutine version of self.reset
+        '''
+        await self.move_async(-self._steps)
+        self.locked = True
+
+    async def zero_async(self):
+        '''
+        Coroutine version of self.zero
+        '''
+        self._steps = 0
+        self.lost = False
+        await self.move_async(6)
+        await self.move_async(-6)
+        self.locked = True
 
     #__________________________________________________________________
     # private methods
+    def _profile(self, profile):
+        '''
+        Motion profile of a move
+        '''
+        if profile is None:
+            profile = self.PROFILE
+        if profile is None:
+            profile = Constant(self.DELAY)
+        return profile
+
+    def _move_sleep(self, schedule, rotation):
+        '''
+        Writes each step and then sleeps until the next one
+        '''
+        write = self._write
+        now = self.timer.now
+        record = self.recorder.record if self.recorder is not None else None
+        start = now()
+        previous = None
+        try:
+            for offset, (set_mask, clear_mask) in zip(schedule,
+                    self._phases(rotation, schedule.steps)):
+                if previous is not None:
+                    sleep((offset - previous)/NS)
+                if record is not None:
+                    record(start + offset, now())
+                write(set_mask, clear_mask)
+                self._steps += rotation
+                previous = offset
+        finally:
+            self._sync_state()
+        if previous is not None:
+            sleep(max(schedule.end - previous, 0)/NS)
+        return _report(schedule, start, self.timer.now(), 0, 0)
+
+    def _move_deadline(self, schedule, rotation, start=None):
+        '''
+        Writes step n at start + offsets[n]. Steps written more than
+        TOLERANCE after their deadline are counted as late
+        '''
+        write = self._write
+        tolerance = int(self.TOLERANCE*NS)
+        wait_until = self.timer.wait_until
+        record = self.recorder.record if self.recorder is not None else None
+        late = 0
+        max_lateness = 0
+        if start is None:
+            start = self.timer.now()
+        try:
+            for offset, (set_mask, clear_mask) in zip(schedule,
+                    self._phases(rotation, schedule.steps)):
+                deadline = start + offset
+                actual = wait_until(deadline)
+                if record is not None:
+                    record(deadline, actual)
+                lateness = actual - deadline
+                if lateness > tolerance:
+                    late += 1
+                    max_lateness = max(max_lateness, lateness)
+                write(set_mask, clear_mask)
+                self._steps += rotation
+        finally:
+            self._sync_state()
+        # hold the last step until the end of the move
+        finish = wait_until(start + schedule.end)
+        return _report(schedule, start, finish, late, max_lateness/NS)
+
+    def _phases(self, rotation, count):
+        '''
+        Iterator over the (set_mask, clear_mask) of the next 'count'
+        steps in the 'rotation' direction
+        '''
+        length = len(self._waveform)
+        index = self._steps%length
+        order = [(index + rotation*(n + 1))%length for n in range(length)]
+        phases = [(self._waveform[i], self._pins_mask ^ self._waveform[i])
+            for i in order]
+        return islice(cycle(phases), count)
+
+    def _log(self, moving=False):
+        '''
+        Records the position in the journal
+        '''
+        if self.journal is not None:
+            self.journal.write(self.name, self._steps, self.locked, moving)
+
+    def _write(self, set_mask, clear_mask):
+        '''
+        Writes the bitmasks through the bank or the backend
+        '''
+        if self.bank is None:
+            self.backend.write(set_mask, clear_mask)
+        else:
+            self.bank.stage(set_mask, clear_mask)
+
+    def _sync_state(self):
+        '''
+        Updates self.actual_state to the current step
+        '''
+        self.actual_state = self._step_list[self._steps%len(self._step_list)]
+
     def _set_step(self, states):
         '''
         Sets the pins A_1, A_2, B_1, B_2, 1 or 0 (HIGH ou LOW)
         '''
         self.actual_state = states
-        GPIO.output(self.PINS, states)
+        self._write(*mask(self.PINS, states))
+
+class MotorGroup(_Stoppable):
+    '''
+    This class moves several Motor objects together. Linear moves are
+    interpolated with a DDA (Bresenham) so all the axes step from the
+    same timing loop and arrive at the same time, and each tick writes
+    the coils of the motors that stepped in a single GPIO call through
+    self.bank.
+
+    The group uses the timer and motion profile of its own, the
+    default profile is a constant delay of the slowest motor DELAY.
+    Profiles apply to the axis with the most steps.
+
+    self.stop() interrupts a group move like Motor.stop and
+    self.recorder records the ticks like Motor.recorder.
+    '''
+
+    #__________________________________________________________________
+    # class attributes
+    VERBOSE = False
+    TOLERANCE = Motor.TOLERANCE
+    TIMER = Motor.TIMER
+    PROFILE = None
+
+    #__________________________________________________________________
+    # magic methods
+    def __init__(self, motors, verbose=VERBOSE, timer=TIMER, profile=PROFILE):
+        '''
+        Arguments are a list of Motor objects, verbose to display
+        reports on the movements, the timer used to wait for the step
+        deadlines and the default motion profile, the last three are
+        optional.
+        '''
+        self.motors = list(motors)
+        self.VERBOSE = verbose
+        self.timer = timer
+        self.PROFILE = profile
+        self.PINS = [pin for motor in self.motors for pin in motor.PINS]
+        backends = set(id(motor.backend) for motor in self.motors)
+        if len(backends) != 1:
+            raise ValueError('The motors of a group must share the backend')
+        self.bank = Bank(self.motors[0].backend)
+        self.recorder = None
+        self.last_move = None
+
+    def __repr__(self):
+        return 'MotorGroup of {0} motors, Steps: {1}'.format(
+            len(self.motors), self.steps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.cleanup()
+
+    #__________________________________________________________________
+    # properties
+    @property
+    def steps(self):
+        '''
+        Tuple with the steps of each motor
+        '''
+        return tuple(motor.steps for motor in self.motors)
+
+    @steps.setter
+    def steps(self, value):
+        self.move_to(value)
+
+    #__________________________________________________________________
+    # methods
+    def move(self, steps, profile=None, start=None):
+        '''
+        Moves each motor the number of steps in the list 'steps' along
+        a straight line. 'start' is the deadline of the first tick, as
+        in Motor.move. Returns a MoveStats report, the steps in the
+        report are the ticks of the timing loop.
+        '''
+        if len(steps) != len(self.motors):
+            raise ValueError('expected {0} steps, got {1}'.format(
+                len(self.motors), len(steps)))
+        major = max(abs(step) for step in steps)
+        if major == 0:
+            return
+        if self.VERBOSE:
+            print(str(self)+ ', Moving: {0} steps'.format(list(steps)))
+        axes = [(motor, abs(step), (step > 0) - (step < 0),
+            motor._phases((step > 0) - (step < 0), abs(step)))
+            for motor, step in zip(self.motors, steps) if step]
+        errors = [major//2]*len(axes)
+        tolerance = int(self.TOLERANCE*NS)
+        timer = self.timer
+        write = self.bank._write
+        record = self.recorder.record if self.recorder is not None else None
+        late = 0
+        max_lateness = 0
+        self._start_move()
+        schedule = None
+        try:
+            schedule = _Schedule(self, self._profile(profile), major)
+            if start is None:
+                start = timer.now()
+            for offset in schedule:
+                deadline = start + offset
+                actual = timer.wait_until(deadline)
+                if record is not None:
+                    record(deadline, actual)
+                lateness = actual - deadline
+                if lateness > tolerance:
+                    late += 1
+                    max_lateness = max(max_lateness, lateness)
+                # the motors that step are written together
+                set_mask = clear_mask = 0
+                for i, (motor, delta, rotation, phases) in enumerate(axes):
+                    errors[i] -= delta
+                    if errors[i] < 0:
+                        errors[i] += major
+                        step_set, step_clear = next(phases)
+                        set_mask |= step_set
+                        clear_mask |= step_clear
+                        motor._steps += rotation
+                if set_mask | clear_mask:
+                    write(set_mask, clear_mask)
+        finally:
+            for motor, delta, rotation, phases in axes:
+                motor._sync_state()
+                motor.locked = True
+            self._end_move(schedule)
+        finish = timer.wait_until(start + schedule.end)
+        self.last_move = _report(schedule, start, finish, late,
+            max_lateness/NS)
+        return self.last_move
+
+    def move_to(self, steps, profile=None, start=None):
+        '''
+        Moves the motors to the positions in the list 'steps' along a
+        straight line
+        '''
+        return self.move([target - motor.steps
+            for motor, target in zip(self.motors, steps)], profile, start)
+
+    def release(self):
+        '''
+        Releases all motors
+        '''
+        for motor in self.motors:
+            motor.release()
+
+    def lock(self):
+        '''
+        Locks all motors
+        '''
+        for motor in self.motors:
+            motor.lock()
+
+    def reset(self, profile=None):
+        '''
+        Returns all motors to their initial position together
+        '''
+        self.move_to([0]*len(self.motors), profile)
+
+    def cleanup(self):
+        '''
+        Cleans the GPIO resources of all motors
+        '''
+        for motor in self.motors:
+            motor.cleanup()
+
+    #__________________________________________________________________
+    # private methods
+    def _log(self, moving=False):
+        '''
+        Records the positions of the motors in their journals
+        '''
+        for motor in self.motors:
+            motor._log(moving)
+
+    def _profile(self, profile):
+        '''
+        Motion profile of a move
+        '''
+        if profile is None:
+            profile = self.PROFILE
+        if profile is None:
+            profile = Constant(max(motor.DELAY for motor in self.motors))
+        return profile
 
 #______________________________________________________________________
 # backwards compatibility
@@ -208,20 +910,7 @@ def zig_zag(motor1, motor2, amp1, amp2, delay=None):
     It's possible to change the delay between steps with the 'delay'
     argument
     '''
-    step1, rep1 = amp1
-    step2, rep2 = amp2
-    if delay:
-        motor1.delay = delay
-        motor2.delay = delay
-    for i in range(rep1):
-        motor2.move(step2*rep2)
-        motor1.move(step1)
-        motor2.move(-step2*rep2)
-        motor1.move(step1)
-    motor1.reset()
-    motor2.reset()
-    motor1.release()
-    motor2.release()
+    _follow(motor1, motor2, trajectory.zig_zag(amp1, amp2), delay, True)
 
 def square_spiral(motor1, motor2, amplitude, delay=None):
     '''
@@ -239,16 +928,15 @@ def square_spiral(motor1, motor2, amplitude, delay=None):
     It's possible to change the delay between steps with the 'delay'
     argument
     '''
-    step, rep = amplitude
-    if delay:
-        motor1.delay = delay
-        motor2.delay = delay
-    for i in range(rep):
-        motor2.steps = (i+1)*step
-        motor1.steps = (i+1)*step
-        motor1.steps = -(i+1)*step
-        motor2.steps = -(i+1)*step
-    motor1.reset()
-    motor2.reset()
-    motor1.release()
-    motor2.release()
+    _follow(motor1, motor2, trajectory.square_spiral(amplitude), delay)
+
+def _follow(motor1, motor2, waypoints, delay, relative=False):
+    '''
+    Runs a trajectory with two motors, then resets and releases them
+    '''
+    group = MotorGroup([motor1, motor2])
+    profile = Constant(delay) if delay else None
+    trajectory.follow(group, waypoints, profile,
+        origin=group.steps if relative else None)
+    group.reset(profile)
+    group.release()
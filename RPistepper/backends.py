@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper GPIO backends
+
+A backend drives the GPIO pins used by the motors. Available backends:
+    * RPiGPIOBackend: writes through the RPi.GPIO library.
+    * SimulatedBackend: keeps the pin states in memory and records a
+      timestamped trace of the writes, it runs anywhere.
+    * MMapBackend: writes the GPIO set/clear registers of the BCM2835
+      family through an mmap'd file (/dev/gpiomem by default), the
+      fastest write path on a RPi.
+
+The default backend is chosen by the RPISTEPPER_BACKEND environment
+variable ('rpi', 'sim' or 'mmap', default = 'rpi') the first time a
+motor needs it, or set with set_backend.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+import os
+import mmap
+import struct
+from time import perf_counter_ns
+
+#______________________________________________________________________
+# globals
+BACKEND_VARIABLE = 'RPISTEPPER_BACKEND'
+_backend = None
+
+#______________________________________________________________________
+# classes
+class Backend(object):
+    '''
+    Base class of the GPIO backends. Pins use BCM indexing.
+
+    Pin states can be written as lists with self.output or as bitmasks
+    (bit n is the BCM pin n) with self.write. Backends without a native
+    bitmask write decode the masks once and cache the result.
+    '''
+    DECODE_CACHE = 4096
+
+    def __init__(self):
+        self._decoded = {}
+
+    def __repr__(self):
+        return '{0}()'.format(type(self).__name__)
+
+    def setup(self, pins):
+        '''
+        Configures the pins as outputs
+        '''
+        raise NotImplementedError
+
+    def output(self, pins, states):
+        '''
+        Sets each pin in 'pins' to the state (1 or 0) at the same index
+        in 'states'
+        '''
+        raise NotImplementedError
+
+    def cleanup(self, pins):
+        '''
+        Releases the pins
+        '''
+        raise NotImplementedError
+
+    def write(self, set_mask, clear_mask):
+        '''
+        Sets the pins in the bitmask 'set_mask' and clears the pins in
+        'clear_mask'
+        '''
+        try:
+            pins, states = self._decoded[set_mask, clear_mask]
+        except KeyError:
+            if len(self._decoded) >= self.DECODE_CACHE:
+                self._decoded.clear()
+            pins, states = self._decoded[set_mask, clear_mask] = unmask(
+                set_mask, clear_mask)
+        self.output(pins, states)
+
+class RPiGPIOBackend(Backend):
+    '''
+    Writes through the RPi.GPIO library
+    '''
+    def __init__(self):
+        super(RPiGPIOBackend, self).__init__()
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        # bind the library call directly, saving a python call per write
+        self.output = GPIO.output
+
+    def setup(self, pins):
+        self.GPIO.setmode(self.GPIO.BCM)
+        self.GPIO.setup(pins, self.GPIO.OUT)
+
+    def output(self, pins, states):
+        self.GPIO.output(pins, states)
+
+    def cleanup(self, pins):
+        self.GPIO.cleanup(pins)
+
+class SimulatedBackend(Backend):
+    '''
+    Keeps the pin states in self.state, a dict {pin: state}. When
+    'record' is set, every write is appended to self.trace as a tuple
+    (timestamp in ns, pins, states).
+    '''
+    def __init__(self, record=True, clock=perf_counter_ns):
+        super(SimulatedBackend, self).__init__()
+        self.record = record
+        self.clock = clock
+        self.state = {}
+        self.trace = []
+        self.outputs = set()
+
+    def __repr__(self):
+        return '{0}(record={1})'.format(type(self).__name__, self.record)
+
+    def setup(self, pins):
+        for pin in pins:
+            self.outputs.add(pin)
+            self.state.setdefault(pin, 0)
+
+    def output(self, pins, states):
+        for pin in pins:
+            if pin not in self.outputs:
+                raise RuntimeError(
+                    'The GPIO channel {0} has not been set up as an OUTPUT'.format(pin))
+        self.state.update(zip(pins, states))
+        if self.record:
+            self.trace.append((self.clock(), tuple(pins), tuple(states)))
+
+    def cleanup(self, pins):
+        for pin in pins:
+            self.outputs.discard(pin)
+            self.state.pop(pin, None)
+
+    def clear(self):
+        '''
+        Clears the trace
+        '''
+        del self.trace[:]
+
+class MMapBackend(Backend):
+    '''
+    Writes the GPIO registers of the BCM2835 family through an mmap'd
+    file. 'path' is /dev/gpiomem by default, use /dev/mem with the
+    'offset' of the GPIO block for older kernels. Any regular file of
+    BLOCK_SIZE bytes works as well, which is useful for testing.
+    '''
+    BLOCK_SIZE = 4096
+    GPFSEL0 = 0x00
+    GPSET0 = 0x1c
+    GPCLR0 = 0x28
+    GPLEV0 = 0x34
+
+    def __init__(self, path='/dev/gpiomem', offset=0):
+        super(MMapBackend, self).__init__()
+        self.path = path
+        self.offset = offset
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), self.BLOCK_SIZE,
+            offset=offset)
+        self._pack = struct.Struct('<I').pack_into
+
+    def __repr__(self):
+        return '{0}({1!r}, offset={2})'.format(type(self).__name__,
+            self.path, self.offset)
+
+    def setup(self, pins):
+        for pin in pins:
+            self._function(pin, 1)
+
+    def output(self, pins, states):
+        self.write(*mask(pins, states))
+
+    def write(self, set_mask, clear_mask):
+        if set_mask:
+            self._pack(self._map, self.GPSET0, set_mask)
+        if clear_mask:
+            self._pack(self._map, self.GPCLR0, clear_mask)
+
+    def cleanup(self, pins):
+        self.write(0, sum(1 << pin for pin in pins))
+        for pin in pins:
+            self._function(pin, 0)
+
+    def read(self, register):
+        '''
+        Reads the 32 bits register at the byte offset 'register'
+        '''
+        return struct.unpack_from('<I', self._map, register)[0]
+
+    def close(self):
+        '''
+        Unmaps the registers
+        '''
+        self._map.close()
+        self._file.close()
+
+    def _function(self, pin, function):
+        '''
+        Sets the 3 bits function select of the pin (0 input, 1 output)
+        '''
+        register = self.GPFSEL0 + 4*(pin//10)
+        shift = 3*(pin%10)
+        value = self.read(register) & ~(7 << shift) | function << shift
+        self._pack(self._map, register, value)
+
+#______________________________________________________________________
+# functions
+def mask(pins, states):
+    '''
+    Packs the pin states in a tuple of bitmasks (set_mask, clear_mask)
+    '''
+    set_mask = 0
+    clear_mask = 0
+    for pin, state in zip(pins, states):
+        if state:
+            set_mask |= 1 << pin
+        else:
+            clear_mask |= 1 << pin
+    return set_mask, clear_mask
+
+def unmask(set_mask, clear_mask):
+    '''
+    Unpacks the bitmasks in a tuple of lists (pins, states)
+    '''
+    pins = []
+    states = []
+    pin = 0
+    both = set_mask | clear_mask
+    while both >> pin:
+        if both >> pin & 1:
+            pins.append(pin)
+            states.append(set_mask >> pin & 1)
+        pin += 1
+    return pins, states
+
+BACKENDS = {
+    'rpi': RPiGPIOBackend,
+    'sim': SimulatedBackend,
+    'mmap': MMapBackend,
+}
+
+def get_backend():
+    '''
+    Returns the default backend, creating it on the first call
+    '''
+    global _backend
+    if _backend is None:
+        name = os.environ.get(BACKEND_VARIABLE, 'rpi')
+        if name not in BACKENDS:
+            raise ValueError('Unknown backend {0!r}, please use one of: {1}'.format(
+                name, ', '.join(sorted(BACKENDS))))
+        _backend = BACKENDS[name]()
+    return _backend
+
+def set_backend(backend):
+    '''
+    Sets the default backend
+    '''
+    global _backend
+    _backend = backend
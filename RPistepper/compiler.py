@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper script compiler
+
+Compiles RPistepper shell scripts (see sample.stp) into a Plan. The
+whole script is parsed and validated up front, so a script with an
+error doesn't move any motor, and then lowered to a list of operations:
+    ('new', motor)                ('remove', motor)
+    ('setup', motor, pins)        ('list',)
+    ('move', motor, steps, wait)  ('sleep', milliseconds)
+    ('reset', motor)              ('release', motor)
+    ('lock', motor)               ('zero', motor)
+    ('repeat', count, operations)
+'wait' is the time in milliseconds to wait before the move starts.
+
+Before running, the plan is optimized:
+    * consecutive moves of a motor in the same direction are merged.
+    * 'lock' after a command that leaves the motor locked is dropped.
+    * 'sleep' before a move is folded into the deadline of its first
+      step.
+e.g:
+    with open('sample.stp') as script:
+        plan = compile_script(script)
+    print(plan.duration())
+    plan.run()
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from collections import OrderedDict
+from time import sleep
+import RPistepper as stp
+
+#______________________________________________________________________
+# globals
+PINS = OrderedDict()
+PINS['m0'] = stp.m0
+PINS['m1'] = stp.m1
+PINS['m2'] = stp.m2
+PINS['m3'] = stp.m3
+PINS['m4'] = stp.m4
+PINS['m5'] = stp.m5
+PINS['m6'] = stp.m6
+
+MOTOR_COMMANDS = ('reset', 'release', 'lock', 'zero')
+# reset writes nothing when the motor is already at 0
+LOCKING_COMMANDS = ('move', 'lock', 'zero')
+ZERO_STEPS = 12
+
+#______________________________________________________________________
+# classes
+class CompileError(ValueError):
+    '''
+    Error in a script, 'line' is the line number
+    '''
+    def __init__(self, line, message):
+        super(CompileError, self).__init__('line {0}: {1}'.format(line, message))
+        self.line = line
+        self.message = message
+
+class Plan(object):
+    '''
+    A compiled script. self.operations is the list of operations, see
+    the module documentation.
+    '''
+    def __init__(self, operations, pins):
+        self.operations = operations
+        self.pins = pins
+
+    def __repr__(self):
+        return 'Plan with {0} operations'.format(len(self.operations))
+
+    def __str__(self):
+        return '\n'.join(_format(self.operations))
+
+    def optimize(self):
+        '''
+        Returns the optimized plan
+        '''
+        return Plan(_optimize(self.operations), self.pins)
+
+    def estimate(self, delay=stp.Motor.DELAY):
+        '''
+        Returns a tuple (steps, seconds) with the total number of steps
+        and the predicted runtime of the plan with 'delay' seconds
+        between steps
+        '''
+        steps, seconds = _simulate(self.operations, {}, delay)
+        return steps, seconds
+
+    def duration(self, delay=stp.Motor.DELAY):
+        '''
+        Predicted runtime of the plan in seconds
+        '''
+        return self.estimate(delay)[1]
+
+    def run(self, motors=None, backend=None, verbose=False):
+        '''
+        Runs the plan. 'motors' is a dict {code: Motor} of the motors
+        already created, the motors created by the plan are added to it.
+        If no dict is given the motors are cleaned up at the end.
+        '''
+        owned = motors is None
+        if owned:
+            motors = OrderedDict()
+        runner = _Runner(motors, OrderedDict(self.pins), backend, verbose)
+        try:
+            runner.execute(self.operations)
+        finally:
+            if owned:
+                for motor in motors.values():
+                    motor.cleanup()
+
+class _Runner(object):
+    '''
+    Executes the operations of a plan
+    '''
+    def __init__(self, motors, pins, backend, verbose):
+        self.motors = motors
+        self.pins = pins
+        self.backend = backend
+        self.verbose = verbose
+
+    def execute(self, operations):
+        for operation in operations:
+            kind = operation[0]
+            if kind == 'move':
+                motor, steps, wait = operation[1:]
+                self._log('Moving motor {0} {1} steps', motor, steps)
+                motor = self.motors[motor]
+                if wait and motor.DEADLINE:
+                    motor.move(steps, start=motor.timer.now() + int(wait*1000000))
+                else:
+                    if wait:
+                        sleep(wait/1000.0)
+                    motor.move(steps)
+            elif kind == 'repeat':
+                for i in range(operation[1]):
+                    self.execute(operation[2])
+            elif kind == 'sleep':
+                self._log('Waiting {0} miliseconds', operation[1])
+                sleep(operation[1]/1000.0)
+            elif kind in MOTOR_COMMANDS:
+                getattr(self.motors[operation[1]], kind)()
+                self._log('{0} motor {1} done', kind, operation[1])
+            elif kind == 'new':
+                pins = self.pins[operation[1]]
+                self.motors[operation[1]] = stp.Motor(pins, backend=self.backend)
+                self._log('New motor {0} at pins {1}', operation[1], pins)
+            elif kind == 'remove':
+                self.motors.pop(operation[1]).cleanup()
+                self._log('Removed motor {0}', operation[1])
+            elif kind == 'setup':
+                self.pins[operation[1]] = operation[2]
+                self._log('Setting motor {0} to pins {1}', *operation[1:])
+            elif kind == 'list' and self.verbose:
+                for key, value in self.motors.items():
+                    print(key, '-', value)
+
+    def _log(self, message, *args):
+        if self.verbose:
+            print(message.format(*args))
+
+class _Parser(object):
+    '''
+    Parses and validates a script, tracking the declared motors
+    '''
+    def __init__(self, pins, declared):
+        self.pins = OrderedDict(pins)
+        self.declared = list(declared)
+
+    def parse(self, lines):
+        # stack of (line number, count, operations) of the open blocks
+        blocks = [(0, 1, [])]
+        for number, line in enumerate(lines, 1):
+            args = line.split()
+            if not args:
+                continue
+            command, args = args[0], args[1:]
+            if command in ('exit', 'EOF'):
+                break
+            elif command == 'repeat':
+                self._arguments(number, args, 1)
+                blocks.append((number, self._integer(number, args[0]), []))
+            elif command in ('done', 'abort'):
+                if len(blocks) > 1:
+                    start, count, operations = blocks.pop()
+                    if command == 'done':
+                        blocks[-1][2].append(
+                            self._block(start, count, operations))
+            else:
+                blocks[-1][2].extend(self._command(number, command, args))
+        while len(blocks) > 1:
+            start, count, operations = blocks.pop()
+            blocks[-1][2].append(self._block(start, count, operations))
+        return blocks[0][2]
+
+    def _block(self, number, count, operations):
+        # a block that declares or removes motors can't run twice
+        if count > 1 and any(operation[0] in ('new', 'remove')
+                for operation in _walk(operations)):
+            raise CompileError(number,
+                'Motors can\'t be created or removed inside a repeat block')
+        return ('repeat', count, tuple(operations))
+
+    def _command(self, number, command, args):
+        if command == 'new':
+            if not args:
+                free = [motor for motor in self.pins if motor not in self.declared]
+                if not free:
+                    raise CompileError(number, 'Not enough pins for a new motor')
+                args = free[:1]
+            for motor in args:
+                self._motor(number, motor, declared=False)
+                self.declared.append(motor)
+            return [('new', motor) for motor in args]
+        elif command == 'remove':
+            if not args:
+                if not self.declared:
+                    raise CompileError(number, 'No motors listed')
+                args = self.declared[-1:]
+            for motor in args:
+                self._motor(number, motor)
+                self.declared.remove(motor)
+            return [('remove', motor) for motor in args]
+        elif command == 'setup':
+            self._arguments(number, args, 5)
+            self._motor(number, args[0], declared=None)
+            pins = [self._integer(number, pin) for pin in args[1:]]
+            for pin in pins:
+                if pins.count(pin) > 1:
+                    raise CompileError(number,
+                        'Can\'t assign the same pin for two or more coils')
+                if not (0 <= pin <= 27):
+                    raise CompileError(number,
+                        'Value {0} outside the pins range, please use an integer between 0-27.'.format(pin))
+            self.pins[args[0]] = pins
+            return [('setup', args[0], pins)]
+        elif command == 'list':
+            return [('list',)]
+        elif command == 'move':
+            self._arguments(number, args, 2)
+            self._motor(number, args[0])
+            return [('move', args[0], self._integer(number, args[1]), 0)]
+        elif command == 'sleep':
+            self._arguments(number, args, 1)
+            return [('sleep', self._integer(number, args[0]))]
+        elif command in MOTOR_COMMANDS:
+            if not args:
+                raise CompileError(number,
+                    'Please specify at least one motor to {0}'.format(command))
+            for motor in args:
+                self._motor(number, motor)
+            return [(command, motor) for motor in args]
+        raise CompileError(number, 'Unknown command {0!r}'.format(command))
+
+    def _motor(self, number, motor, declared=True):
+        if motor not in self.pins:
+            raise CompileError(number, 'Please use one of the motor codes: '
+                + ', '.join(self.pins))
+        if declared is True and motor not in self.declared:
+            raise CompileError(number, 'Motor {0} is not listed'.format(motor))
+        if declared is False and motor in self.declared:
+            raise CompileError(number, 'Motor {0} is already listed'.format(motor))
+
+    def _arguments(self, number, args, count):
+        if len(args) != count:
+            raise CompileError(number, 'Incorrect number of arguments')
+
+    def _integer(self, number, value):
+        try:
+            return int(value)
+        except ValueError:
+            raise CompileError(number, 'Argument must be an integer')
+
+#______________________________________________________________________
+# functions
+def compile_script(lines, pins=PINS, declared=(), optimize=True):
+    '''
+    Compiles the script in the iterable of strings 'lines' (e.g. an open
+    file) into a Plan. 'pins' maps the motor codes to their pins and
+    'declared' lists the motors that already exist. Raises CompileError
+    if the script is invalid.
+    '''
+    plan = Plan(_Parser(pins, declared).parse(lines), OrderedDict(pins))
+    if optimize:
+        plan = plan.optimize()
+    return plan
+
+def _walk(operations):
+    '''
+    Iterates over the operations, including the ones inside repeat
+    blocks
+    '''
+    for operation in operations:
+        yield operation
+        if operation[0] == 'repeat':
+            for inner in _walk(operation[2]):
+                yield inner
+
+def _optimize(operations):
+    '''
+    Peephole optimization of a list of operations
+    '''
+    optimized = []
+    wait = 0
+    for operation in operations:
+        kind = operation[0]
+        last = optimized[-1] if optimized else (None, None)
+        if kind == 'sleep':
+            wait += operation[1]
+            continue
+        if kind == 'move':
+            motor, steps = operation[1:3]
+            if steps == 0:
+                continue
+            if not wait and last[0] == 'move' and last[1] == motor and \
+                    (last[2] > 0) == (steps > 0):
+                optimized[-1] = ('move', motor, last[2] + steps, last[3])
+            else:
+                optimized.append(('move', motor, steps, wait))
+                wait = 0
+            continue
+        if kind == 'lock' and last[0] in LOCKING_COMMANDS and \
+                last[1] == operation[1]:
+            continue
+        if kind == 'repeat':
+            body = tuple(_optimize(operation[2]))
+            if not body or not operation[1]:
+                continue
+            operation = ('repeat', operation[1], body)
+        if wait:
+            optimized.append(('sleep', wait))
+            wait = 0
+        optimized.append(operation)
+    if wait:
+        optimized.append(('sleep', wait))
+    return optimized
+
+def _simulate(operations, positions, delay):
+    '''
+    Returns the (steps, seconds) taken by the operations, updating the
+    dict 'positions' of the motors. The first two iterations of a repeat
+    block are simulated, the following ones repeat the second one
+    '''
+    steps = 0
+    seconds = 0.0
+    for operation in operations:
+        kind = operation[0]
+        if kind == 'move':
+            motor, count, wait = operation[1:]
+            positions[motor] = positions.get(motor, 0) + count
+            steps += abs(count)
+            seconds += wait/1000.0
+        elif kind == 'sleep':
+            seconds += operation[1]/1000.0
+        elif kind == 'reset':
+            steps += abs(positions.get(operation[1], 0))
+            positions[operation[1]] = 0
+        elif kind == 'zero':
+            steps += ZERO_STEPS
+            positions[operation[1]] = 0
+        elif kind in ('new', 'remove'):
+            positions[operation[1]] = 0
+        elif kind == 'repeat':
+            count, body = operation[1:]
+            first = _simulate(body, positions, 0)
+            steps += first[0]
+            seconds += first[1]
+            if count > 1:
+                before = dict(positions)
+                second = _simulate(body, positions, 0)
+                rest = count - 1
+                steps += rest*second[0]
+                seconds += rest*second[1]
+                for motor, position in positions.items():
+                    delta = position - before.get(motor, 0)
+                    positions[motor] = position + (rest - 1)*delta
+    return steps, seconds + steps*delay
+
+def _format(operations, indent=''):
+    '''
+    Lines describing the operations
+    '''
+    for operation in operations:
+        if operation[0] == 'repeat':
+            yield '{0}repeat {1}'.format(indent, operation[1])
+            for line in _format(operation[2], indent + '    '):
+                yield line
+            yield indent + 'done'
+        elif operation[0] == 'move' and operation[3]:
+            yield '{0}move {1} {2} (after {3} ms)'.format(indent, *operation[1:])
+        elif operation[0] == 'move':
+            yield '{0}move {1} {2}'.format(indent, *operation[1:3])
+        elif operation[0] == 'setup':
+            yield '{0}setup {1} {2}'.format(indent, operation[1],
+                ' '.join(str(pin) for pin in operation[2]))
+        else:
+            yield indent + ' '.join(str(arg) for arg in operation)
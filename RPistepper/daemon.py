@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper control daemon
+
+A Daemon owns the motors and takes commands from any number of local
+clients through a Unix domain socket or a localhost TCP port, so the
+clients don't set up the GPIOs nor fight over the pins:
+    rpistepper daemon --socket /tmp/rpistepper.sock
+
+Clients send one command per line with the verbs of the shell:
+    move m0 200
+    lock m0 m1
+    sleep 500
+    reset m0 m1
+plus 'stop [motors]' to stop the motors at once and 'status' to get the
+motor positions. Commands can be pipelined, a client may send a whole
+batch without waiting for the replies.
+
+Each motor has its own Executor: the commands of a motor run in the
+order they were sent, the commands of different motors run at the same
+time. The motors wait for their steps with a SleepTimer, the default
+HybridTimer spins holding the GIL and motors spinning on their own
+threads would delay each other's steps. 'sleep' is a barrier, it waits
+for all the previous commands of the client to finish before sleeping.
+Motors are set up the first time they are used and kept until the
+daemon closes.
+
+The daemon streams back one JSON line per command when it's done, with
+the number of the command line in the connection (starting at 1):
+    {"id": 1, "command": "move m0 200", "status": "done", "steps": {"m0": 200}}
+    {"id": 2, "command": "move m9 1", "status": "error", "error": "..."}
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+import os
+import json
+import threading
+import socketserver
+from time import sleep
+from concurrent.futures import wait
+import RPistepper as stp
+from RPistepper.compiler import PINS, MOTOR_COMMANDS
+from RPistepper.executor import Executor
+from RPistepper.timing import SleepTimer
+
+#______________________________________________________________________
+# globals
+HOST = 'localhost'
+PORT = 8713
+
+#______________________________________________________________________
+# classes
+class Daemon(object):
+    '''
+    Owns the motors at 'pins' (an OrderedDict {code: pins}) and serves
+    the clients at 'address': a path for a Unix domain socket or a
+    tuple (host, port) for TCP. 'timer' is the timer of the motors,
+    a SleepTimer by default. See the module documentation.
+    '''
+    def __init__(self, address=(HOST, PORT), pins=PINS, backend=None,
+            timer=None):
+        self.address = address
+        self.pins = pins
+        self.backend = backend
+        self.timer = timer if timer is not None else SleepTimer()
+        self.motors = {}
+        self.executors = {}
+        self._lock = threading.Lock()
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixServer(address, _Handler)
+        else:
+            self.server = _TCPServer(address, _Handler)
+        self.server.owner = self
+
+    def __repr__(self):
+        return 'Daemon at {0!r} with {1} motors'.format(self.address,
+            len(self.motors))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    #__________________________________________________________________
+    # methods
+    def serve_forever(self):
+        '''
+        Serves the clients until shutdown is called
+        '''
+        self.server.serve_forever()
+
+    def shutdown(self):
+        '''
+        Stops serve_forever, from another thread
+        '''
+        self.server.shutdown()
+
+    def close(self):
+        '''
+        Stops the motors, cleans up the GPIOs and closes the socket
+        '''
+        self.server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        with self._lock:
+            for executor in self.executors.values():
+                executor.stop()
+                executor.shutdown()
+            for motor in self.motors.values():
+                motor.cleanup()
+            self.executors.clear()
+            self.motors.clear()
+
+    def motor(self, code):
+        '''
+        Returns the Motor and the Executor of the motor 'code', setting
+        them up on the first use
+        '''
+        if code not in self.pins:
+            raise ValueError('Please use one of the motor codes: {0}'.format(
+                ', '.join(self.pins)))
+        with self._lock:
+            if code not in self.motors:
+                self.motors[code] = stp.Motor(self.pins[code],
+                    timer=self.timer, backend=self.backend)
+                self.executors[code] = Executor('RPistepper-'+code)
+            return self.motors[code], self.executors[code]
+
+    def status(self):
+        '''
+        Dict {code: (steps, locked)} of the motors in use
+        '''
+        with self._lock:
+            return dict((code, (motor.steps, motor.locked))
+                for code, motor in self.motors.items())
+
+    def submit(self, line):
+        '''
+        Parses a command line and submits it to the executors. Returns
+        the list of futures of the command, or None for the commands
+        that are not queued (sleep, stop and status)
+        '''
+        args = line.split()
+        verb, args = args[0], args[1:]
+        if verb == 'move':
+            if len(args) != 2:
+                raise ValueError('Incorrect number of arguments')
+            motor, executor = self.motor(args[0])
+            return [executor.move(motor, int(args[1]))]
+        if verb in MOTOR_COMMANDS:
+            if not args:
+                raise ValueError('Please specify at least one motor to {0}'.format(verb))
+            motors = [self.motor(code) for code in args]
+            return [executor.submit(motor, verb) for motor, executor in motors]
+        if verb == 'stop':
+            codes = args or list(self.motors)
+            for code in codes:
+                self.motor(code)[1].stop()
+            return None
+        raise ValueError('Unknown command {0}'.format(verb))
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _Handler(socketserver.StreamRequestHandler):
+    '''
+    Serves a client connection. When the client closes its side the
+    handler waits for the events of the commands still running
+    '''
+    def setup(self):
+        super(_Handler, self).setup()
+        self._write_lock = threading.Lock()
+        self._watching = threading.Condition()
+        self._watched = 0
+
+    def handle(self):
+        daemon = self.server.owner
+        pending = []
+        for number, line in enumerate(self.rfile, 1):
+            line = line.decode('utf-8').strip()
+            if not line or line.startswith('#'):
+                continue
+            verb = line.split()[0]
+            try:
+                if verb == 'sleep':
+                    args = line.split()[1:]
+                    if len(args) != 1:
+                        raise ValueError('Incorrect number of arguments')
+                    milliseconds = int(args[0])
+                    wait(pending)
+                    pending = []
+                    sleep(milliseconds/1000.0)
+                    self.reply(number, line, 'done')
+                elif verb == 'status':
+                    self.reply(number, line, 'done', motors=daemon.status())
+                else:
+                    futures = daemon.submit(line)
+                    if futures is None:
+                        self.reply(number, line, 'done')
+                    else:
+                        pending = [future for future in pending
+                            if not future.done()] + futures
+                        self.watch(number, line, futures)
+            except (ValueError, RuntimeError) as error:
+                self.reply(number, line, 'error', error=str(error))
+        with self._watching:
+            self._watching.wait_for(lambda: not self._watched)
+
+    def watch(self, number, line, futures):
+        '''
+        Replies when all the futures of a command are done
+        '''
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        codes = line.split()[1:]
+        with self._watching:
+            self._watched += 1
+
+        def done(future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                self.report(number, line, futures, codes)
+            finally:
+                with self._watching:
+                    self._watched -= 1
+                    self._watching.notify_all()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def report(self, number, line, futures, codes):
+        '''
+        Sends the event of a command whose futures are done
+        '''
+        errors = [str(future.exception()) for future in futures
+            if not future.cancelled() and future.exception() is not None]
+        if any(future.cancelled() for future in futures):
+            self.reply(number, line, 'cancelled')
+        elif errors:
+            self.reply(number, line, 'error', error='; '.join(errors))
+        else:
+            motors = self.server.owner.motors
+            self.reply(number, line, 'done', steps=dict(
+                (code, motors[code].steps) for code in codes
+                if code in motors))
+
+    def reply(self, number, line, status, **fields):
+        '''
+        Sends the JSON event of a command
+        '''
+        event = {'id': number, 'command': line, 'status': status}
+        event.update(fields)
+        data = (json.dumps(event, sort_keys=True) + '\n').encode('utf-8')
+        with self._write_lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except (OSError, ValueError):
+                # the client is gone, the commands still run
+                pass
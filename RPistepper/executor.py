@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper background executor
+
+An Executor runs motor commands (move, lock, release, reset, zero) on
+a background thread, in the order they were submitted. Each command
+returns a concurrent.futures.Future, so the caller doesn't wait for the
+motor:
+    with Executor() as executor:
+        executor.move(motor1, 200)
+        done = executor.move(motor2, -100)
+        ...
+        done.result()
+
+Use one executor per motor to run the motors concurrently or share one
+between motors to run their commands one after the other. Moves queued
+for the same motor (or MotorGroup) in the same direction run
+back-to-back: the next move starts at the deadline where the previous
+one ended.
+
+The queue is a collections.deque, whose append and popleft are atomic,
+so submitting a command never waits on the motion thread. Taking the
+next command and stop() share a lock: a stop always finds either the
+command in the queue or the motor armed to stop (see Motor.stop).
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+import threading
+from operator import index
+from collections import deque
+from concurrent.futures import Future
+
+#______________________________________________________________________
+# globals
+MOVING = ('move', 'reset', 'zero')
+
+#______________________________________________________________________
+# classes
+class Executor(object):
+    '''
+    Runs motor commands on a background thread. See the module
+    documentation.
+    '''
+    def __init__(self, name='RPistepper-executor'):
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._dispatch = threading.Lock()
+        self._unfinished = 0
+        self._current = None
+        self._running = True
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return 'Executor with {0} queued commands'.format(self.depth)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.shutdown()
+
+    #__________________________________________________________________
+    # properties
+    @property
+    def depth(self):
+        '''
+        Number of commands waiting in the queue
+        '''
+        return len(self._queue)
+
+    @property
+    def metrics(self):
+        '''
+        Dict with the queue depth and the command counters
+        '''
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+    #__________________________________________________________________
+    # methods
+    def submit(self, motor, method, *args):
+        '''
+        Queues the call motor.method(*args) and returns its Future
+        '''
+        if not self._running:
+            raise RuntimeError('cannot submit commands after shutdown')
+        future = Future()
+        with self._idle:
+            self._unfinished += 1
+        self._queue.append((future, motor, method, args))
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._wakeup.set()
+        return future
+
+    def move(self, motor, steps, profile=None):
+        '''
+        Queues motor.move(steps, profile)
+        '''
+        return self.submit(motor, 'move', steps, profile)
+
+    def lock(self, motor):
+        '''
+        Queues motor.lock()
+        '''
+        return self.submit(motor, 'lock')
+
+    def release(self, motor):
+        '''
+        Queues motor.release()
+        '''
+        return self.submit(motor, 'release')
+
+    def reset(self, motor):
+        '''
+        Queues motor.reset()
+        '''
+        return self.submit(motor, 'reset')
+
+    def zero(self, motor):
+        '''
+        Queues motor.zero()
+        '''
+        return self.submit(motor, 'zero')
+
+    def wait_idle(self, timeout=None):
+        '''
+        Blocks until every queued command is done. Returns False if
+        'timeout' seconds passed before that
+        '''
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._unfinished, timeout)
+
+    def cancel(self):
+        '''
+        Cancels the queued commands that haven't started. Returns the
+        number of cancelled commands
+        '''
+        cancelled = 0
+        while True:
+            try:
+                future = self._queue.popleft()[0]
+            except IndexError:
+                break
+            cancelled += future.cancel()
+            self._done()
+        return cancelled
+
+    def stop(self, hard=False, release=False):
+        '''
+        Emergency stop: cancels the queued commands and stops the move
+        in progress (see Motor.stop)
+        '''
+        with self._dispatch:
+            cancelled = self.cancel()
+            motor = self._current
+            if motor is not None:
+                motor.stop(hard, release)
+        return cancelled
+
+    def shutdown(self, wait=True):
+        '''
+        Stops the executor after the queued commands are done
+        '''
+        self._running = False
+        self._wakeup.set()
+        if wait:
+            self._thread.join()
+
+    #__________________________________________________________________
+    # private methods
+    def _next(self):
+        '''
+        Pops the next command, waiting for it if the queue is empty,
+        and marks its motor as the current one. Returns None when the
+        executor is shut down
+        '''
+        while True:
+            with self._dispatch:
+                if self._queue:
+                    command = self._queue.popleft()
+                    self._current = command[1]
+                    if command[2] in MOVING:
+                        command[1]._arm()
+                    return command
+            if not self._running:
+                return None
+            self._wakeup.clear()
+            # a command may have arrived between popleft and clear
+            if not self._queue:
+                self._wakeup.wait()
+
+    def _run(self):
+        # (motor, end, direction) of the previous move, if the next
+        # command was already queued when it ended
+        previous = None
+        while True:
+            command = self._next()
+            if command is None:
+                return
+            future, motor, method, args = command
+            try:
+                if not future.set_running_or_notify_cancel():
+                    previous = None
+                    continue
+                try:
+                    if method == 'move':
+                        result = self._move(previous, motor, *args)
+                    else:
+                        result = getattr(motor, method)(*args)
+                    previous = None
+                    if method == 'move' and result is not None and self._queue:
+                        previous = (motor, result.end, _direction(args[0]))
+                except BaseException as error:
+                    previous = None
+                    self.failed += 1
+                    future.set_exception(error)
+                else:
+                    self.completed += 1
+                    future.set_result(result)
+            finally:
+                with self._dispatch:
+                    if method in MOVING:
+                        motor._disarm()
+                    self._current = None
+                self._done()
+
+    def _done(self):
+        '''
+        Marks a command as finished
+        '''
+        with self._idle:
+            self._unfinished -= 1
+            if not self._unfinished:
+                self._idle.notify_all()
+
+    def _move(self, previous, motor, steps, profile=None):
+        '''
+        Runs a move, starting at the end of the previous move if it was
+        a move of the same motor in the same direction
+        '''
+        start = None
+        if previous is not None and previous[0] is motor and \
+                previous[2] == _direction(steps):
+            start = previous[1]
+        return motor.move(steps, profile, start=start)
+
+#______________________________________________________________________
+# functions
+def _direction(steps):
+    '''
+    Direction of a move of a Motor (steps) or a MotorGroup (list of
+    steps), moves chain only in the same direction
+    '''
+    try:
+        return index(steps) > 0
+    except TypeError:
+        pass
+    return tuple((step > 0) - (step < 0) for step in steps)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper G-code interpreter
+
+Runs G-code programs on a set of motors. Each axis letter is mapped to
+a Motor and its number of steps per unit (mm, or inches after G20):
+    interpreter = Interpreter({'X': motor_x, 'Y': motor_y},
+        {'X': 80, 'Y': 80})
+    with open('part.gcode') as program:
+        interpreter.run(program)
+
+Supported codes:
+    G0 X Y ... F    rapid move at RAPID units/minute
+    G1 X Y ... F    linear move at the feed rate F (units/minute)
+    G4 P or S       dwell P milliseconds or S seconds
+    G20/G21         units in inches/millimeters
+    G28 X Y ...     move the listed axes (default all) to 0
+    G90/G91         absolute/relative coordinates
+Other G codes are errors. M, T, S and N words, O program numbers and
+the % lines that delimit a program are ignored.
+
+The program is read line by line and at most LOOKAHEAD moves are kept
+in a buffer, so programs of any size run in constant memory from a
+file or a pipe. Moves are interpolated by a MotorGroup at a constant
+step period given by the feed rate. Consecutive moves in the same
+direction at the same feed are merged in the buffer and every move
+starts at the deadline where the previous one ended, so the motors
+don't stop between segments.
+
+With an 'acceleration' (units/s^2) the moves are run by a Lookahead
+planner instead: they accelerate and decelerate with Blend profiles
+and turn the corners at the highest speed the direction change allows
+(see RPistepper.lookahead), feed rates are capped to the rapid rate.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+import re
+from math import sqrt
+from collections import deque
+from . import MotorGroup, Constant
+from .lookahead import Lookahead, DEVIATION
+from .timing import NS
+
+#______________________________________________________________________
+# globals
+LOOKAHEAD = 16
+FEED = 600.0
+RAPID = 3000.0
+INCH = 25.4
+IGNORED = 'MOTSN'
+
+_WORD = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+_COMMENT = re.compile(r'\(.*?\)|;.*|^\s*%.*')
+
+#______________________________________________________________________
+# classes
+class GCodeError(ValueError):
+    '''
+    Error in a G-code program, 'line' is the line number
+    '''
+    def __init__(self, line, message):
+        super(GCodeError, self).__init__('line {0}: {1}'.format(line, message))
+        self.line = line
+        self.message = message
+
+class Interpreter(object):
+    '''
+    Runs G-code with the motors in 'axes', a dict {letter: Motor}, and
+    'steps_per_unit', a dict {letter: steps}. 'feed' is the feed rate
+    until the program sets one and 'rapid' the rate of G0 moves, both
+    in units (mm) per minute. 'acceleration' in units/s^2 enables the
+    lookahead planner, 'deviation' is its junction deviation in steps.
+    See the module documentation.
+    '''
+    def __init__(self, axes, steps_per_unit, feed=FEED, rapid=RAPID,
+            lookahead=LOOKAHEAD, acceleration=None, deviation=DEVIATION):
+        self.letters = sorted(axes)
+        for letter in self.letters:
+            if letter not in steps_per_unit:
+                raise ValueError('No steps per unit for the axis {0}'.format(
+                    letter))
+        self.group = MotorGroup([axes[letter] for letter in self.letters])
+        self.steps_per_unit = [float(steps_per_unit[letter])
+            for letter in self.letters]
+        self.feed = feed
+        self.rapid = rapid
+        self.lookahead = lookahead
+        self.planner = None
+        if acceleration is not None:
+            # the planner works in steps, the slowest axis bounds it
+            ratio = min(self.steps_per_unit)
+            self.planner = Lookahead(self.group,
+                rapid/60.0*max(self.steps_per_unit), acceleration*ratio,
+                deviation, lookahead)
+        self.reset()
+
+    def __repr__(self):
+        return 'G-code interpreter of the axes {0}'.format(''.join(self.letters))
+
+    #__________________________________________________________________
+    # methods
+    def reset(self):
+        '''
+        Resets the modal state: absolute millimeters, G0, default feed,
+        and sets the current position of the motors as the origin
+        '''
+        self.absolute = True
+        self.scale = 1.0
+        self.motion = 0
+        self.feed_rate = self.feed
+        self.position = [0.0]*len(self.letters)
+        self._origin = list(self.group.steps)
+        self._steps = list(self._origin)
+        self._buffer = deque()
+        self._end = None
+        self.lines = 0
+        self.moves = 0
+
+    def run(self, lines):
+        '''
+        Runs an iterable of G-code lines, e.g. a file, as it's read.
+        Returns the number of moves made
+        '''
+        for number, line in enumerate(lines, self.lines + 1):
+            self.lines = number
+            self.execute(line, number)
+        self.flush()
+        return self.moves
+
+    def execute(self, line, number=None):
+        '''
+        Interprets a line, moves are buffered
+        '''
+        words = self._parse(line, number)
+        codes = [value for letter, value in words if letter == 'G']
+        values = dict((letter, value) for letter, value in words
+            if letter != 'G')
+        # units and distance modes apply to the whole line, F included
+        for code in codes:
+            if code == 20:
+                self.scale = INCH
+            elif code == 21:
+                self.scale = 1.0
+            elif code == 90:
+                self.absolute = True
+            elif code == 91:
+                self.absolute = False
+        if 'F' in values:
+            if values['F'] <= 0:
+                raise GCodeError(number, 'feed rate must be positive')
+            self.feed_rate = values['F']*self.scale
+        targets = dict((letter, values[letter]) for letter in self.letters
+            if letter in values)
+        for code in codes:
+            if code in (0, 1):
+                self.motion = int(code)
+            elif code == 4:
+                self._dwell(values.get('P', 1000*values.get('S', 0))/1000.0)
+            elif code == 28:
+                home = targets or dict((letter, 0) for letter in self.letters)
+                self._move(dict((letter, 0) for letter in home), True, 0)
+                targets = {}
+            elif code not in (20, 21, 90, 91):
+                raise GCodeError(number, 'unsupported code G{0:g}'.format(code))
+        unknown = [letter for letter in values if letter not in self.letters
+            and letter not in IGNORED + 'FPG']
+        if unknown:
+            raise GCodeError(number, 'unknown axis {0}'.format(unknown[0]))
+        if targets:
+            self._move(targets, self.absolute, self.motion)
+
+    def flush(self):
+        '''
+        Runs the buffered moves and waits for the last one to end
+        '''
+        while self._buffer:
+            self._run(self._buffer.popleft())
+        if self.planner is not None:
+            self.planner.flush()
+        if self._end is not None:
+            self.group.timer.wait_until(self._end)
+            self._end = None
+
+    #__________________________________________________________________
+    # private methods
+    def _parse(self, line, number):
+        '''
+        List of the (letter, value) words of a line
+        '''
+        line = _COMMENT.sub('', line).upper().strip()
+        words = []
+        position = 0
+        for match in _WORD.finditer(line):
+            if line[position:match.start()].strip():
+                raise GCodeError(number, 'can\'t parse {0!r}'.format(
+                    line[position:match.start()].strip()))
+            words.append((match.group(1), float(match.group(2))))
+            position = match.end()
+        if line[position:].strip():
+            raise GCodeError(number, 'can\'t parse {0!r}'.format(
+                line[position:].strip()))
+        return words
+
+    def _move(self, targets, absolute, motion):
+        '''
+        Buffers a move to the 'targets' {letter: units}
+        '''
+        for i, letter in enumerate(self.letters):
+            if letter in targets:
+                value = targets[letter]*self.scale
+                self.position[i] = value if absolute else self.position[i] + value
+        steps = [origin + int(round(units*ratio)) for origin, units, ratio in
+            zip(self._origin, self.position, self.steps_per_unit)]
+        deltas = [target - step for target, step in zip(steps, self._steps)]
+        self._steps = steps
+        major = max(abs(delta) for delta in deltas)
+        if not major:
+            return
+        length = sqrt(sum((delta/ratio)**2
+            for delta, ratio in zip(deltas, self.steps_per_unit)))
+        rate = self.rapid if motion == 0 else self.feed_rate
+        period = length/(rate/60.0)/major
+        self._push(('move', deltas, period))
+
+    def _dwell(self, seconds):
+        self._push(('dwell', seconds))
+
+    def _push(self, command):
+        '''
+        Adds a command to the lookahead buffer, merging it with the last
+        one when both are moves in the same direction at the same step
+        period, runs the oldest command when the buffer is full
+        '''
+        if self._buffer and command[0] == 'move' == self._buffer[-1][0]:
+            last = self._buffer[-1]
+            if last[2] == command[2] and _collinear(last[1], command[1]):
+                self._buffer[-1] = ('move', [a + b for a, b in
+                    zip(last[1], command[1])], command[2])
+                return
+        self._buffer.append(command)
+        while len(self._buffer) > self.lookahead:
+            self._run(self._buffer.popleft())
+
+    def _run(self, command):
+        '''
+        Runs a buffered command, chained to the end of the previous one
+        '''
+        if self.planner is not None:
+            self._plan(command)
+            return
+        if command[0] == 'dwell':
+            timer = self.group.timer
+            start = self._end if self._end is not None else timer.now()
+            self._end = start + int(command[1]*NS)
+            return
+        deltas, period = command[1], command[2]
+        report = self.group.move(deltas, Constant(period), start=self._end)
+        self._end = report.end
+        self.moves += 1
+
+    def _plan(self, command):
+        '''
+        Passes a buffered command to the lookahead planner
+        '''
+        if command[0] == 'dwell':
+            self.planner.dwell(command[1])
+            return
+        deltas, period = command[1], command[2]
+        # path speed in steps/s from the step period of the major axis
+        length = sqrt(sum(delta*delta for delta in deltas))
+        major = max(abs(delta) for delta in deltas)
+        self.planner.add(deltas, length/major/period)
+        self.moves += 1
+
+#______________________________________________________________________
+# functions
+def _collinear(a, b):
+    '''
+    True if the step vectors a and b point in the same direction
+    '''
+    if any((x > 0) - (x < 0) != (y > 0) - (y < 0) for x, y in zip(a, b)):
+        return False
+    major_a = max(abs(x) for x in a)
+    major_b = max(abs(y) for y in b)
+    return all(x*major_b == y*major_a for x, y in zip(a, b))
@@ -2,20 +2,25 @@
 # -*- coding: utf-8 -*-
 #______________________________________________________________________
 # imports
-import RPistepper as stp
-from sys import version_info
+import queue
+import tkinter as tk
+from tkinter import ttk
 from collections import OrderedDict
-
-if version_info[0] == 3:
-    import tkinter as tk
-    from tkinter import ttk
-else:
-    import Tkinter as tk
-    from Tkinter import ttk
+import RPistepper as stp
+from RPistepper import trajectory
+from RPistepper.executor import Executor
 
 #______________________________________________________________________
 # classes
 class GUI(tk.Tk):
+    '''
+    The motions run on a background Executor, the window stays
+    responsive. Finished commands are sent back through self.events,
+    which is polled with after() FPS times per second, the step counts
+    are refreshed at the same rate. 2D movements are streamed to the
+    executor WINDOW waypoints at a time. The motors are created once
+    and shared by the views, see get_motor.
+    '''
     PINS = OrderedDict()
     PINS['m0'] = stp.m0
     PINS['m1'] = stp.m1
@@ -26,6 +31,8 @@ class GUI(tk.Tk):
     PINS['m6'] = stp.m6
 
     B_WIDTH = 15
+    FPS = 20
+    WINDOW = 4
 
     def __init__(self, *args, **kwargs):
         super(GUI, self).__init__(*args, **kwargs)
@@ -39,7 +46,7 @@ class GUI(tk.Tk):
         self.menubar = tk.Menu()
 
         self.filemenu = tk.Menu(self.menubar, tearoff=0)
-        self.filemenu.add_command(label='Exit', command=lambda: self.quit())
+        self.filemenu.add_command(label='Exit', command=self.exit_cmd)
         self.menubar.add_cascade(label='File', menu=self.filemenu)
 
         self.modemenu = tk.Menu(self.menubar, tearoff=0)
@@ -65,6 +72,22 @@ class GUI(tk.Tk):
         self.motor_status = OrderedDict()
         self.motor_status_var = OrderedDict()
         self.motor_on = OrderedDict()
+        self.registry = {}
+
+        self.executor = Executor('RPistepper-gui')
+        self.events = queue.Queue()
+        self.job = None
+        self.job_status_var = tk.StringVar()
+        self.job_status_var.set('Idle')
+
+        self.stop_frame = ttk.Frame(self.mainframe, padding=3)
+        self.stop_frame.grid(column=0, row=2, sticky=(tk.W, tk.E))
+        self.stop_button = ttk.Button(self.stop_frame, text='Stop',
+            command=self.stop_button_cmd)
+        self.stop_button.grid(column=0, row=0, padx=3)
+        self.job_status = tk.Label(self.stop_frame,
+            textvariable=self.job_status_var)
+        self.job_status.grid(column=1, row=0, padx=3, sticky=tk.W)
 
         self.on_off_button = ttk.Frame(self.mainframe, border=1, relief=tk.SUNKEN)
         self.on_off_button.grid(column=0, row=0, sticky=(tk.N, tk.W, tk.E, tk.S),
@@ -101,6 +124,8 @@ class GUI(tk.Tk):
 
         self.switch_movements_2d_view()
         # self.switch_control_motors_view()
+        self.protocol('WM_DELETE_WINDOW', self.exit_cmd)
+        self.after(1000//self.FPS, self.poll)
 
     def dialog_window(self, title, text):
         top = tk.Toplevel()
@@ -118,8 +143,111 @@ class GUI(tk.Tk):
             status = 'locked'
         else:
             status = 'released'
-        self.motor_status_var[motor].set('Motor {0}\nsteps: {1}'.format(
-            status, steps))
+        message = 'Motor {0}\nsteps: {1}'.format(status, steps)
+        # the labels are refreshed every frame, only redraw changes
+        if self.motor_status_var[motor].get() != message:
+            self.motor_status_var[motor].set(message)
+
+    def poll(self):
+        '''
+        Handles the finished commands, feeds the running 2D movement to
+        the executor and refreshes the step counts, once per frame
+        '''
+        while True:
+            try:
+                future = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if not future.cancelled() and future.exception() is not None:
+                self.dialog_window('error', str(future.exception()))
+        if self.job is not None:
+            self.feed_job()
+        for motor in self.motor_object:
+            self.update_message(motor)
+        self.after(1000//self.FPS, self.poll)
+
+    def submit(self, motor, method, *args):
+        '''
+        Runs motor.method(*args) on the executor
+        '''
+        future = self.executor.submit(motor, method, *args)
+        future.add_done_callback(self.events.put)
+        return future
+
+    def start_job(self, name, mx, my, waypoints):
+        '''
+        Streams the waypoints of a 2D movement to the executor with
+        the motors at the pins of mx and my
+        '''
+        if self.job is not None:
+            self.dialog_window('error', 'A movement is already running')
+            return
+        motors = [self.get_motor(mx), self.get_motor(my)]
+        self.job = {
+            'name': name,
+            'group': stp.MotorGroup(motors),
+            'waypoints': waypoints,
+            'position': (0, 0),
+            'last': None,
+        }
+        self.feed_job()
+
+    def feed_job(self):
+        '''
+        Keeps up to WINDOW waypoints of the running movement queued.
+        The waypoints are queued as relative moves, so the movement
+        starts wherever the motors are and returns there at the end
+        '''
+        job = self.job
+        group = job['group']
+        while job['waypoints'] is not None and self.executor.depth < self.WINDOW:
+            try:
+                point = next(job['waypoints'])
+            except StopIteration:
+                job['waypoints'] = None
+                self.submit(group, 'move', [-step for step in job['position']])
+                job['last'] = self.submit(group, 'release')
+            else:
+                self.submit(group, 'move', [target - step
+                    for target, step in zip(point, job['position'])])
+                job['position'] = point
+        if job['last'] is not None and job['last'].done():
+            self.job = None
+            self.job_status_var.set('Idle')
+        else:
+            self.job_status_var.set('{0}: steps {1}'.format(job['name'],
+                group.steps))
+
+    def get_motor(self, motor):
+        '''
+        Motor at the pins of the motor code 'motor'. Motors are created
+        once and kept in self.registry by their pins, so the views share
+        them and their positions carry over between runs
+        '''
+        pins = tuple(self.PINS[motor])
+        if pins not in self.registry:
+            self.registry[pins] = stp.Motor(self.PINS[motor])
+        return self.registry[pins]
+
+    def exit_cmd(self):
+        '''
+        Stops the motors, cleans up the GPIOs and quits
+        '''
+        self.executor.stop()
+        self.executor.shutdown()
+        for motor in self.registry.values():
+            motor.cleanup()
+        self.registry.clear()
+        self.quit()
+
+    def stop_button_cmd(self):
+        '''
+        Stops the motors, decelerating, and cancels the queued commands
+        '''
+        self.executor.stop()
+        if self.job is not None:
+            self.job['waypoints'] = None
+            self.job['last'] = self.submit(self.job['group'], 'release')
 
     def switch_control_motors_view(self):
         self.movements_2d_view.grid_remove()
@@ -258,11 +386,11 @@ class GUI(tk.Tk):
         if self.motor_on[motor]:
             self.motor_block[motor].grid_remove()
             if motor in self.motor_object:
-                self.motor_object[motor].cleanup()
+                self.submit(self.motor_object[motor], 'release')
                 del self.motor_object[motor]
         else:
             self.motor_block[motor].grid()
-            self.motor_object[motor] = stp.Motor(self.PINS[motor])
+            self.motor_object[motor] = self.get_motor(motor)
             self.update_message(motor)
 
         self.motor_on[motor] = not self.motor_on[motor]
@@ -276,36 +404,31 @@ class GUI(tk.Tk):
             steps = int(steps)
         except:
             return
-        self.motor_object[motor].move(steps)
-        self.update_message(motor)
+        self.submit(self.motor_object[motor], 'move', steps)
 
     def release_button_cmd(self, motor):
         '''
         Action for the move button
         '''
-        self.motor_object[motor].release()
-        self.update_message(motor)
+        self.submit(self.motor_object[motor], 'release')
 
     def lock_button_cmd(self, motor):
         '''
         Action for the move button
         '''
-        self.motor_object[motor].lock()
-        self.update_message(motor)
+        self.submit(self.motor_object[motor], 'lock')
 
     def reset_button_cmd(self, motor):
         '''
         Action for the move button
         '''
-        self.motor_object[motor].reset()
-        self.update_message(motor)
+        self.submit(self.motor_object[motor], 'reset')
 
     def zero_button_cmd(self, motor):
         '''
         Action for the move button
         '''
-        self.motor_object[motor].zero()
-        self.update_message(motor)
+        self.submit(self.motor_object[motor], 'zero')
 
     def execute_zig_zag_cmd(self):
         mx = 'm'+str(self.zig_zag_frame['checkbox']['var_x'].get())
@@ -318,11 +441,8 @@ class GUI(tk.Tk):
             self.dialog_window('error', 'You can\'t control two motors in the same port')
             return
         else:
-            motors = (stp.Motor(self.PINS[mx]), stp.Motor(self.PINS[my]))
-            stp.zig_zag(*motors, (ax, rx), (ay, ry))
-            for motor in motors:
-                motor.cleanup()
-                del motor
+            self.start_job('Zig-Zag', mx, my,
+                trajectory.zig_zag((ax, rx), (ay, ry)))
 
     def execute_s_spiral_cmd(self):
         mx = 'm'+str(self.s_spiral_frame['checkbox']['var_x'].get())
@@ -333,8 +453,5 @@ class GUI(tk.Tk):
             self.dialog_window('error', 'You can\'t control two motors in the same port')
             return
         else:
-            motors = (stp.Motor(self.PINS[mx]), stp.Motor(self.PINS[my]))
-            stp.square_spiral(*motors, (ax, rx))
-            for motor in motors:
-                motor.cleanup()
-                del motor
+            self.start_job('Square-Spiral', mx, my,
+                trajectory.square_spiral((ax, rx)))
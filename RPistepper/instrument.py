@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper step timing instrumentation
+
+A StepRecorder keeps the scheduled and actual time of the last 'size'
+steps in a ring buffer. Attach it to a Motor or a MotorGroup to record
+every step they write:
+    recorder = StepRecorder()
+    motor.recorder = recorder
+    motor.move(1000)
+    print(recorder.summary())
+
+When no recorder is attached the step loops only pay for a None check,
+so it's cheap to leave the hook in place.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from array import array
+from .timing import NS
+
+#______________________________________________________________________
+# classes
+class StepRecorder(object):
+    '''
+    Ring buffer of the (scheduled, actual) times in ns of the last
+    'size' steps. Steps written more than 'tolerance' seconds after
+    their deadline are counted as missed deadlines.
+    '''
+    SIZE = 4096
+    TOLERANCE = 0.00005
+    PERCENTILES = (50, 90, 99, 100)
+
+    def __init__(self, size=SIZE, tolerance=TOLERANCE):
+        self.size = size
+        self.tolerance = tolerance
+        self._tolerance = int(tolerance*NS)
+        self.reset()
+
+    def __repr__(self):
+        return 'StepRecorder with {0} of {1} steps'.format(len(self), self.size)
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    #__________________________________________________________________
+    # methods
+    def reset(self):
+        '''
+        Clears the recorded steps and counters
+        '''
+        self._scheduled = array('q', bytes(8*self.size))
+        self._actual = array('q', bytes(8*self.size))
+        self.count = 0
+        self.missed = 0
+
+    def record(self, scheduled, actual):
+        '''
+        Records a step scheduled at 'scheduled' written at 'actual'
+        '''
+        index = self.count%self.size
+        self._scheduled[index] = scheduled
+        self._actual[index] = actual
+        self.count += 1
+        if actual - scheduled > self._tolerance:
+            self.missed += 1
+
+    def steps(self):
+        '''
+        List of the recorded (scheduled, actual) times, oldest first
+        '''
+        start = self.count%self.size if self.count > self.size else 0
+        indexes = [(start + i)%self.size for i in range(len(self))]
+        return [(self._scheduled[i], self._actual[i]) for i in indexes]
+
+    def jitter(self, *percentiles):
+        '''
+        Percentiles (0-100) of the lateness of the recorded steps in
+        seconds, default = 50, 90, 99 and 100 (the maximum). Returns a
+        dict {percentile: lateness}
+        '''
+        percentiles = percentiles or self.PERCENTILES
+        lateness = sorted(actual - scheduled
+            for scheduled, actual in self.steps())
+        if not lateness:
+            return dict((percentile, None) for percentile in percentiles)
+        result = {}
+        for percentile in percentiles:
+            rank = max(int(round(percentile/100.0*len(lateness))) - 1, 0)
+            result[percentile] = lateness[rank]/NS
+        return result
+
+    def rate(self):
+        '''
+        Steps per second achieved over the recorded steps. Idle time
+        between moves counts, reset the recorder to measure a move
+        '''
+        steps = self.steps()
+        if len(steps) < 2:
+            return None
+        span = steps[-1][1] - steps[0][1]
+        return (len(steps) - 1)*NS/span if span else float('inf')
+
+    def summary(self):
+        '''
+        Dict with the counters, jitter percentiles and rate
+        '''
+        return {
+            'steps': self.count,
+            'recorded': len(self),
+            'missed': self.missed,
+            'jitter': self.jitter(),
+            'rate': self.rate(),
+        }
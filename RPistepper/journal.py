@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper position journal
+
+A Journal keeps the position and lock state of the motors in a file,
+so they can be recovered after a restart instead of homing every axis
+again:
+    journal = Journal('/var/lib/rpistepper/journal')
+    motor = Motor(m0, journal=journal, name='x')
+    if not motor.recovered:
+        motor.zero()
+
+The file is an append-only log of fixed size records written through
+mmap, so a record costs a memory copy and no system call. Motors write
+one record when a move starts, flagged as moving, and one when it ends,
+never one per step. A position whose last record is still flagged as
+moving was lost mid-move and is not recovered. When the file is full
+it's compacted down to the last record of each motor in a new file
+that replaces it. The map is flushed to disk every FLUSH_EVERY records
+and on close, the records written since the last flush survive a
+crash of the program but not a power loss.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+import os
+import mmap
+import struct
+import threading
+from collections import namedtuple
+
+#______________________________________________________________________
+# globals
+Position = namedtuple('Position', ['steps', 'locked', 'moving'])
+
+#______________________________________________________________________
+# classes
+class Journal(object):
+    '''
+    Append-only journal of motor positions in the file 'path' of 'size'
+    bytes. See the module documentation.
+    '''
+    # name, steps, flags
+    RECORD = struct.Struct('<16sqB7x')
+    SIZE = 64*1024
+    FLUSH_EVERY = 32
+    VALID = 1
+    LOCKED = 2
+    MOVING = 4
+
+    def __init__(self, path, size=SIZE, flush_every=FLUSH_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.compactions = 0
+        self._file = open(path, 'a+b')
+        self._file.seek(0, os.SEEK_END)
+        size = max(size, self._file.tell())
+        size -= size%self.RECORD.size
+        if size < 2*self.RECORD.size:
+            raise ValueError('The journal must hold at least 2 records')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self.size = size
+        self.positions = {}
+        self._end = self._scan()
+
+    def __repr__(self):
+        return 'Journal({0!r}) with {1} motors, {2} of {3} bytes used'.format(
+            self.path, len(self.positions), self._end, self.size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    #__________________________________________________________________
+    # methods
+    def recover(self, name):
+        '''
+        Last Position (steps, locked, moving) recorded for 'name', or
+        None if the journal has no record of it
+        '''
+        return self.positions.get(name)
+
+    def write(self, name, steps, locked=False, moving=False):
+        '''
+        Appends a record of the motor 'name'
+        '''
+        key = name.encode('utf-8')
+        if len(key) > 16:
+            raise ValueError('Journal names are limited to 16 bytes')
+        flags = self.VALID | self.LOCKED*bool(locked) | self.MOVING*bool(moving)
+        with self._lock:
+            if self._end + self.RECORD.size > self.size:
+                self._compact()
+                if self._end + self.RECORD.size > self.size:
+                    raise ValueError('The journal is full')
+            # the flags are written last, a torn record is not valid
+            self.RECORD.pack_into(self._map, self._end, key, steps, 0)
+            self._map[self._end + 16 + 8] = flags
+            self._end += self.RECORD.size
+            self.positions[name] = Position(steps, bool(locked), bool(moving))
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush()
+
+    def compact(self):
+        '''
+        Rewrites the journal with the last record of each motor
+        '''
+        with self._lock:
+            self._compact()
+
+    def flush(self):
+        '''
+        Writes the pending records to disk
+        '''
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        '''
+        Flushes and closes the journal
+        '''
+        with self._lock:
+            if self._map.closed:
+                return
+            self._flush()
+            self._map.close()
+            self._file.close()
+
+    #__________________________________________________________________
+    # private methods
+    def _scan(self):
+        '''
+        Reads the valid records into self.positions, returns the offset
+        of the end of the log
+        '''
+        end = 0
+        while end + self.RECORD.size <= self.size:
+            key, steps, flags = self.RECORD.unpack_from(self._map, end)
+            if not flags & self.VALID:
+                break
+            self.positions[key.rstrip(b'\0').decode('utf-8')] = Position(
+                steps, bool(flags & self.LOCKED), bool(flags & self.MOVING))
+            end += self.RECORD.size
+        return end
+
+    def _compact(self):
+        '''
+        Writes the last records to a new file that replaces the journal,
+        a crash while compacting leaves the old journal in place
+        '''
+        records = b''.join(self.RECORD.pack(name.encode('utf-8'), steps,
+            self.VALID | self.LOCKED*locked | self.MOVING*moving)
+            for name, (steps, locked, moving) in self.positions.items())
+        temporary = self.path + '.compact'
+        with open(temporary, 'wb') as compacted:
+            compacted.write(records)
+            compacted.truncate(self.size)
+            compacted.flush()
+            os.fsync(compacted.fileno())
+        self._map.close()
+        self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), self.size)
+        self._end = len(records)
+        self._pending = 0
+        self.compactions += 1
+
+    def _flush(self):
+        self._map.flush()
+        self._pending = 0
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper lookahead planner
+
+Chains of moves normally stop at every junction: each move starts and
+ends at the start speed of its profile. A Lookahead buffers the next
+moves of a MotorGroup and picks the highest speed at each junction
+that the direction change and the acceleration allow, so the motors
+flow through the junctions without stopping:
+    planner = Lookahead(group, max_speed=800, acceleration=4000)
+    planner.follow(trajectory.square_spiral((100, 10)))
+
+The junction speed follows the junction deviation model: the motors
+may cut a corner by up to 'deviation' steps, which bounds the speed of
+a turn by the centripetal acceleration of the arc that fits in it.
+Collinear junctions run at full speed, reversals stop. A backward and
+a forward pass over the buffer then limit every junction speed to what
+the acceleration can reach or brake to within the moves, and the
+oldest move runs with a Blend profile from its entry to its exit
+speed when the buffer is full. The last move in the buffer always
+plans to stop, so it's safe to run out of moves.
+
+Speeds are given in steps/s and accelerations in steps/s^2 along the
+path (the euclidean length of the moves in steps). The profiles of
+the MotorGroup run on the axis with the most steps, the speeds are
+scaled to it for each move.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from math import sqrt
+from collections import deque
+from .profiles import Blend
+from .timing import NS
+
+#______________________________________________________________________
+# globals
+SIZE = 16
+DEVIATION = 2.0
+
+#______________________________________________________________________
+# classes
+class _Move(object):
+    '''
+    A buffered move: the steps of each axis, its length and direction,
+    its top speed and the speeds planned at its ends
+    '''
+    __slots__ = ('steps', 'length', 'unit', 'speed', 'max_entry', 'entry',
+        'exit')
+
+    def __init__(self, steps, speed):
+        self.steps = steps
+        self.length = sqrt(sum(step*step for step in steps))
+        self.unit = [step/self.length for step in steps]
+        self.speed = speed
+        self.max_entry = 0.0
+        self.entry = 0.0
+        self.exit = 0.0
+
+class Lookahead(object):
+    '''
+    Plans the junction speeds of the moves of the MotorGroup 'group'.
+    'max_speed' and 'acceleration' limit the moves, 'deviation' is the
+    junction deviation in steps and 'size' the number of buffered
+    moves. See the module documentation.
+    '''
+    def __init__(self, group, max_speed, acceleration, deviation=DEVIATION,
+            size=SIZE):
+        if max_speed <= 0 or acceleration <= 0:
+            raise ValueError('max_speed and acceleration must be positive')
+        self.group = group
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.deviation = deviation
+        self.size = size
+        # the speed reached after one step from rest, as in Trapezoidal
+        self.min_speed = sqrt(acceleration/2.0)
+        self._buffer = deque()
+        self._previous = None
+        self._speed = self.min_speed
+        self._end = None
+        self.moves = 0
+
+    def __repr__(self):
+        return 'Lookahead planner with {0} buffered moves'.format(
+            len(self._buffer))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        if type is None:
+            self.flush()
+
+    #__________________________________________________________________
+    # methods
+    def add(self, steps, speed=None):
+        '''
+        Buffers a move of 'steps' (a list with the steps of each axis)
+        at up to 'speed' steps/s, default = max_speed. Runs the oldest
+        move when the buffer is full
+        '''
+        self._append(steps, speed)
+        while len(self._buffer) > self.size:
+            self._run(self._pop())
+
+    def flush(self):
+        '''
+        Runs the buffered moves, the last one stops, and waits for the
+        motors to finish
+        '''
+        while self._buffer:
+            self._run(self._pop())
+        self._previous = None
+        self._speed = self.min_speed
+        if self._end is not None:
+            self.group.timer.wait_until(self._end)
+            self._end = None
+
+    def dwell(self, seconds):
+        '''
+        Stops at the end of the buffered moves and waits 'seconds'
+        before the next one, without blocking
+        '''
+        while self._buffer:
+            self._run(self._pop())
+        self._previous = None
+        self._speed = self.min_speed
+        timer = self.group.timer
+        start = self._end if self._end is not None else timer.now()
+        self._end = start + int(seconds*NS)
+
+    def follow(self, waypoints):
+        '''
+        Moves through the waypoints (tuples of target steps, see
+        RPistepper.trajectory) and stops at the last one. Returns the
+        number of moves
+        '''
+        position = list(self.group.steps)
+        for point in waypoints:
+            self.add([target - step for target, step in zip(point, position)])
+            position = list(point)
+        self.flush()
+        return self.moves
+
+    def profiles(self, waypoints, start=None):
+        '''
+        Plans the waypoints from 'start' (default = the origin) without
+        moving the motors, yields a tuple (steps, profile) for each
+        move. The total time of a path is the sum of the durations
+        '''
+        position = list(start or [0]*len(self.group.motors))
+        for point in waypoints:
+            self._append([target - step for target, step in
+                zip(point, position)])
+            position = list(point)
+            while len(self._buffer) > self.size:
+                yield self._pop()
+        while self._buffer:
+            yield self._pop()
+        self._previous = None
+        self._speed = self.min_speed
+
+    #__________________________________________________________________
+    # private methods
+    def _append(self, steps, speed=None):
+        '''
+        Adds a move to the buffer and plans it
+        '''
+        steps = [int(step) for step in steps]
+        if not any(steps):
+            return
+        speed = min(speed or self.max_speed, self.max_speed)
+        move = _Move(steps, max(speed, self.min_speed))
+        if self._previous is None:
+            move.max_entry = self.min_speed
+        else:
+            move.max_entry = min(self._junction(self._previous, move),
+                self._previous.speed, move.speed)
+        self._previous = move
+        self._buffer.append(move)
+        self._plan()
+
+    def _pop(self):
+        '''
+        Removes the oldest move from the buffer, returns its steps and
+        its Blend profile, scaled from the path to the axis with the
+        most steps
+        '''
+        move = self._buffer.popleft()
+        ratio = max(abs(step) for step in move.steps)/move.length
+        self._speed = move.exit
+        return move.steps, Blend(move.speed*ratio, self.acceleration*ratio,
+            move.entry*ratio, move.exit*ratio)
+
+    def _junction(self, previous, move):
+        '''
+        Highest speed at the junction of two moves
+        '''
+        cosine = -sum(a*b for a, b in zip(previous.unit, move.unit))
+        if cosine < -0.999999:
+            # straight line
+            return self.max_speed
+        if cosine > 0.999999:
+            # reversal
+            return self.min_speed
+        sine = sqrt((1 - cosine)/2)
+        return max(sqrt(self.acceleration*self.deviation*sine/(1 - sine)),
+            self.min_speed)
+
+    def _plan(self):
+        '''
+        Recomputes the junction speeds of the buffered moves, the first
+        one keeps the entry speed of the move that ran before it
+        '''
+        a = self.acceleration
+        exit = self.min_speed
+        for move in reversed(self._buffer):
+            move.exit = exit
+            move.entry = min(move.max_entry,
+                sqrt(exit*exit + 2*a*move.length))
+            exit = move.entry
+        entry = self._speed
+        for move in self._buffer:
+            move.entry = min(move.entry, entry)
+            move.exit = min(move.exit, sqrt(move.entry**2 + 2*a*move.length))
+            entry = move.exit
+
+    def _run(self, move):
+        '''
+        Runs a move (steps, profile), chained to the end of the previous
+        one
+        '''
+        steps, profile = move
+        report = self.group.move(steps, profile, start=self._end)
+        self._end = report.end
+        self.moves += 1
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper array planner
+
+Plans a whole path up front with numpy. The waypoints of a MotorGroup
+(or a list of Motors) are turned into arrays with the pin bitmasks to
+set and clear at each tick of the timing loop and the time offset of
+each tick, then run() only walks the arrays:
+    path = plan(group, trajectory.raster(2000, 1000, 10),
+        Trapezoidal(800, 4000))
+    path.save('raster.npz')
+    ...
+    path = load('raster.npz')
+    path.run(group)
+
+Each segment is interpolated with the same DDA as MotorGroup.move and
+timed with its motion profile, Constant and Trapezoidal profiles are
+computed in closed form over the whole segment at once. Planning and
+running are timed separately in path.planning and path.last_run.
+
+numpy is optional, it's only needed to plan, save and load paths.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from time import perf_counter
+from . import _report, Constant, Trapezoidal
+from .timing import NS
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#______________________________________________________________________
+# classes
+class Path(object):
+    '''
+    A planned path: self.set_masks and self.clear_masks hold the pins
+    written at each tick and self.times the offsets of the ticks in ns,
+    followed by the end of the path. self.pins are the pins of each
+    motor, self.origin and self.targets their positions before and
+    after the path.
+    '''
+    TOLERANCE = 0.00005
+
+    def __init__(self, pins, origin, targets, set_masks, clear_masks, times,
+            planning=0.0):
+        self.pins = [list(motor_pins) for motor_pins in pins]
+        self.origin = tuple(int(step) for step in origin)
+        self.targets = tuple(int(step) for step in targets)
+        self.set_masks = set_masks
+        self.clear_masks = clear_masks
+        self.times = times
+        self.planning = planning
+        self.last_run = None
+
+    def __repr__(self):
+        return 'Path of {0} ticks, {1:.3f} seconds, from {2} to {3}'.format(
+            self.steps, self.end/NS, self.origin, self.targets)
+
+    #__________________________________________________________________
+    # properties
+    @property
+    def steps(self):
+        '''
+        Number of ticks
+        '''
+        return len(self.times) - 1
+
+    @property
+    def end(self):
+        '''
+        Duration of the path in ns
+        '''
+        return int(self.times[-1])
+
+    #__________________________________________________________________
+    # methods
+    def run(self, motors, start=None):
+        '''
+        Runs the path with a MotorGroup or a list of Motors, which must
+        be the motors it was planned for at the origin of the path.
+        'start' is the deadline of the first tick, as in Motor.move.
+        If the run raises the motors are left with motor.lost set.
+        Returns a MoveStats report, also stored in self.last_run
+        '''
+        timer = getattr(motors, 'timer', None)
+        motors = _motors(motors)
+        if [list(motor.PINS) for motor in motors] != self.pins:
+            raise ValueError('the path was planned for the pins {0}'.format(
+                self.pins))
+        if tuple(motor.steps for motor in motors) != self.origin:
+            raise ValueError('the path starts at {0}, the motors are at {1}'.format(
+                self.origin, tuple(motor.steps for motor in motors)))
+        if timer is None:
+            timer = motors[0].timer
+        # plain python ints are much faster to walk than numpy scalars
+        times = self.times.tolist()
+        ticks = zip(times, self.set_masks.tolist(), self.clear_masks.tolist())
+        write = motors[0].backend.write
+        wait_until = timer.wait_until
+        tolerance = int(self.TOLERANCE*NS)
+        late = 0
+        max_lateness = 0
+        if start is None:
+            start = timer.now()
+        for motor in motors:
+            motor._log(True)
+        completed = False
+        try:
+            for offset, set_mask, clear_mask in ticks:
+                deadline = start + offset
+                lateness = wait_until(deadline) - deadline
+                if lateness > tolerance:
+                    late += 1
+                    max_lateness = max(max_lateness, lateness)
+                write(set_mask, clear_mask)
+            completed = True
+        finally:
+            # positions are only known at the ends of a path, a run
+            # that raised leaves them unknown and their journal records
+            # flagged as moving
+            for motor, target in zip(motors, self.targets):
+                motor.locked = True
+                if completed:
+                    motor._steps = target
+                    motor._sync_state()
+                    motor._log()
+                else:
+                    motor.lost = True
+        finish = wait_until(start + times[-1])
+        self.last_run = _report(self, start, finish, late, max_lateness/NS)
+        return self.last_run
+
+    def save(self, path):
+        '''
+        Saves the path in the numpy .npz file 'path'
+        '''
+        _numpy()
+        np.savez(path, pins=np.array(self.pins), origin=np.array(self.origin),
+            targets=np.array(self.targets), set_masks=self.set_masks,
+            clear_masks=self.clear_masks, times=self.times)
+
+#______________________________________________________________________
+# functions
+def plan(motors, waypoints, profile=None):
+    '''
+    Plans a path through the waypoints (tuples of target steps, one per
+    motor) for a MotorGroup or a list of Motors, starting from their
+    current positions. 'profile' defaults to the profile of the group
+    or to a constant delay of the slowest motor. Returns a Path
+    '''
+    _numpy()
+    started = perf_counter()
+    if profile is None:
+        profile = _default_profile(motors)
+    motors = _motors(motors)
+    waveforms = [np.array(motor._waveform, dtype=np.uint32)
+        for motor in motors]
+    pins_masks = [motor._pins_mask for motor in motors]
+    position = [motor.steps for motor in motors]
+    origin = list(position)
+    set_masks = []
+    clear_masks = []
+    times = []
+    elapsed = 0
+    for point in waypoints:
+        point = [int(target) for target in point]
+        if len(point) != len(motors):
+            raise ValueError('expected {0} targets, got {1}'.format(
+                len(motors), len(point)))
+        deltas = [target - step for target, step in zip(point, position)]
+        major = max(abs(delta) for delta in deltas)
+        if major == 0:
+            continue
+        ticks = np.arange(1, major + 1, dtype=np.int64)
+        set_mask = np.zeros(major, dtype=np.uint32)
+        clear_mask = np.zeros(major, dtype=np.uint32)
+        for i, delta in enumerate(deltas):
+            if not delta:
+                continue
+            # steps taken after each tick by the DDA of MotorGroup.move
+            taken = np.maximum(0, -((major//2 - ticks*abs(delta))//major))
+            stepped = np.diff(taken, prepend=0) > 0
+            phase = (position[i] + (1 if delta > 0 else -1)*taken)%len(
+                waveforms[i])
+            wave = waveforms[i][phase]
+            set_mask |= np.where(stepped, wave, 0).astype(np.uint32)
+            clear_mask |= np.where(stepped, pins_masks[i] ^ wave, 0).astype(
+                np.uint32)
+        offsets = _offsets(profile, major)
+        set_masks.append(set_mask)
+        clear_masks.append(clear_mask)
+        times.append(offsets[:-1] + elapsed)
+        elapsed += int(offsets[-1])
+        position = point
+    times.append(np.array([elapsed], dtype=np.int64))
+    empty = np.zeros(0, dtype=np.uint32)
+    return Path([motor.PINS for motor in motors], origin, position,
+        np.concatenate(set_masks or [empty]),
+        np.concatenate(clear_masks or [empty]),
+        np.concatenate(times), perf_counter() - started)
+
+def load(path):
+    '''
+    Loads a Path saved with Path.save
+    '''
+    _numpy()
+    with np.load(path) as data:
+        return Path(data['pins'].tolist(), data['origin'].tolist(),
+            data['targets'].tolist(), data['set_masks'],
+            data['clear_masks'], data['times'])
+
+def _offsets(profile, steps):
+    '''
+    Time offsets in ns of the ticks of a 'steps' long segment followed
+    by its end, vectorized for the Constant and Trapezoidal profiles
+    '''
+    x = np.arange(steps + 1, dtype=np.float64)
+    if type(profile) is Constant:
+        return np.arange(steps + 1, dtype=np.int64)*int(profile.delay*NS)
+    if type(profile) is not Trapezoidal:
+        return np.array(profile.schedule(steps), dtype=np.int64)
+    v0, a = profile.start_speed, profile.acceleration
+    peak = min(profile.max_speed, (v0*v0 + a*steps)**0.5)
+    ramp_time = (peak - v0)/a
+    ramp_length = v0*ramp_time + a*ramp_time**2/2
+    total = 2*ramp_time + (steps - 2*ramp_length)/peak
+    accelerating = (np.sqrt(v0*v0 + 2*a*np.minimum(x, ramp_length)) - v0)/a
+    cruising = ramp_time + (x - ramp_length)/peak
+    decelerating = total - (np.sqrt(v0*v0 + 2*a*np.clip(steps - x, 0,
+        ramp_length)) - v0)/a
+    times = np.where(x <= ramp_length, accelerating,
+        np.where(x <= steps - ramp_length, cruising, decelerating))
+    return (times*NS).astype(np.int64)
+
+def _motors(motors):
+    '''
+    List of the motors of a MotorGroup or a list of Motors
+    '''
+    motors = list(getattr(motors, 'motors', motors))
+    if len(set(id(motor.backend) for motor in motors)) != 1:
+        raise ValueError('The motors of a path must share the backend')
+    return motors
+
+def _default_profile(motors):
+    '''
+    Profile of the group or constant delay of the slowest motor
+    '''
+    if hasattr(motors, '_profile'):
+        return motors._profile(None)
+    return Constant(max(motor.DELAY for motor in motors))
+
+def _numpy():
+    '''
+    Raises ImportError when numpy is missing
+    '''
+    if np is None:
+        raise ImportError('The planner needs numpy, please install it')
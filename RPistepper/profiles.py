@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper motion profiles
+
+A profile turns a move of 'steps' steps into a schedule, a tuple with
+the time offset (in nanoseconds) of each step followed by the end of
+the move. Available profiles:
+    * Constant: every step takes 'delay' seconds.
+    * Trapezoidal: constant acceleration ramps up to 'max_speed'.
+    * SCurve: jerk limited ramps up to 'max_speed'.
+    * Blend: constant acceleration from an entry speed up to
+      'max_speed' and down to an exit speed, for moves that continue
+      into the next one (see RPistepper.lookahead).
+
+Speeds are given in steps/s, accelerations in steps/s^2 and jerk in
+steps/s^3. Schedules are cached by (profile, steps), so repeated moves
+of the same length don't pay for generating them.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from functools import lru_cache
+from math import sqrt
+from .timing import NS
+
+#______________________________________________________________________
+# globals
+CACHE_SIZE = 256
+
+#______________________________________________________________________
+# classes
+class Profile(object):
+    '''
+    Base class of the motion profiles. Profiles are immutable and
+    compared by their parameters, so they can be used as cache keys.
+    '''
+    def __init__(self, *params):
+        self._params = params
+
+    def __repr__(self):
+        return '{0}{1}'.format(type(self).__name__, self._params)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._params == other._params
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self._params))
+
+    def schedule(self, steps):
+        '''
+        Returns the time offsets in nanoseconds of each step of a move
+        of 'steps' steps, followed by the end of the move
+        '''
+        return schedule(self, abs(steps))
+
+    def duration(self, steps):
+        '''
+        Duration of a move of 'steps' steps in seconds
+        '''
+        return self.schedule(steps)[-1]/NS
+
+    def _times(self, steps):
+        '''
+        Returns the times in seconds of steps + 1 positions
+        '''
+        raise NotImplementedError
+
+class Constant(Profile):
+    '''
+    Every step takes 'delay' seconds
+    '''
+    def __init__(self, delay):
+        super(Constant, self).__init__(delay)
+        self.delay = delay
+
+    def _times(self, steps):
+        period = int(self.delay*NS)
+        return [n*period for n in range(steps + 1)]
+
+class Ramped(Profile):
+    '''
+    Base class of the profiles that accelerate from 'start_speed' up to
+    a peak speed, cruise, and decelerate back symmetrically. Subclasses
+    describe the acceleration ramp with _ramp.
+    '''
+    def __init__(self, max_speed, acceleration, start_speed, *params):
+        if max_speed <= 0 or acceleration <= 0:
+            raise ValueError('max_speed and acceleration must be positive')
+        if start_speed is None:
+            start_speed = sqrt(acceleration/2.0)
+        start_speed = min(start_speed, max_speed)
+        super(Ramped, self).__init__(max_speed, acceleration, start_speed,
+            *params)
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.start_speed = start_speed
+
+    def _ramp(self, peak):
+        '''
+        Returns the duration of the ramp from start_speed to 'peak' and
+        the functions velocity(t) and distance(t) inside the ramp
+        '''
+        raise NotImplementedError
+
+    def _peak(self, steps):
+        '''
+        Highest peak speed whose two ramps fit in 'steps'
+        '''
+        duration, velocity, distance = self._ramp(self.max_speed)
+        if 2*distance(duration) <= steps:
+            return self.max_speed
+        low, high = self.start_speed, self.max_speed
+        for i in range(60):
+            peak = (low + high)/2
+            duration, velocity, distance = self._ramp(peak)
+            if 2*distance(duration) <= steps:
+                low = peak
+            else:
+                high = peak
+        return low
+
+    def _times(self, steps):
+        peak = self._peak(steps)
+        ramp_time, velocity, distance = self._ramp(peak)
+        ramp_length = distance(ramp_time)
+        total = 2*ramp_time + (steps - 2*ramp_length)/peak
+
+        def invert(x, t):
+            # Newton's method on distance(t) = x, starting from t
+            for i in range(50):
+                error = distance(t) - x
+                if abs(error) < 1e-9:
+                    break
+                t = min(max(t - error/velocity(t), 0), ramp_time)
+            return t
+
+        times = []
+        t = 0
+        for x in range(steps + 1):
+            if x <= ramp_length:
+                t = invert(x, t)
+                times.append(t)
+            elif x <= steps - ramp_length:
+                times.append(ramp_time + (x - ramp_length)/peak)
+            else:
+                times.append(total - times[steps - x])
+        return [int(t*NS) for t in times]
+
+class Trapezoidal(Ramped):
+    '''
+    Constant acceleration ramps from 'start_speed' to 'max_speed'. The
+    default start speed is sqrt(acceleration/2), the speed reached
+    after the first step from rest.
+    '''
+    def __init__(self, max_speed, acceleration, start_speed=None):
+        super(Trapezoidal, self).__init__(max_speed, acceleration,
+            start_speed)
+
+    def _ramp(self, peak):
+        v0, a = self.start_speed, self.acceleration
+        return ((peak - v0)/a,
+            lambda t: v0 + a*t,
+            lambda t: v0*t + a*t*t/2)
+
+class SCurve(Ramped):
+    '''
+    Jerk limited ramps from 'start_speed' to 'max_speed'. The
+    acceleration grows linearly up to 'acceleration' at 'jerk' rate,
+    stays constant and decreases back to zero at the cruise speed. The
+    default jerk reaches the full acceleration in 0.1 seconds.
+    '''
+    def __init__(self, max_speed, acceleration, jerk=None, start_speed=None):
+        if jerk is None:
+            jerk = acceleration*10
+        if jerk <= 0:
+            raise ValueError('jerk must be positive')
+        super(SCurve, self).__init__(max_speed, acceleration, start_speed,
+            jerk)
+        self.jerk = jerk
+
+    def _ramp(self, peak):
+        v0, j = self.start_speed, self.jerk
+        dv = peak - v0
+        if dv >= self.acceleration**2/j:
+            tj = self.acceleration/j
+            ta = dv/self.acceleration - tj
+        else:
+            tj = sqrt(dv/j)
+            ta = 0
+        a = j*tj
+        v1 = v0 + j*tj*tj/2
+        d1 = v0*tj + j*tj**3/6
+        v2 = v1 + a*ta
+        d2 = d1 + v1*ta + a*ta*ta/2
+
+        def velocity(t):
+            if t < tj:
+                return v0 + j*t*t/2
+            if t < tj + ta:
+                return v1 + a*(t - tj)
+            t = min(t - tj - ta, tj)
+            return v2 + a*t - j*t*t/2
+
+        def distance(t):
+            if t < tj:
+                return v0*t + j*t**3/6
+            if t < tj + ta:
+                t -= tj
+                return d1 + v1*t + a*t*t/2
+            t = min(t - tj - ta, tj)
+            return d2 + v2*t + a*t*t/2 - j*t**3/6
+
+        return 2*tj + ta, velocity, distance
+
+class Blend(Profile):
+    '''
+    Constant acceleration ramps from 'entry_speed' up to 'max_speed'
+    and down to 'exit_speed'. The peak speed is lowered when the move
+    is too short to reach 'max_speed'. The entry speed is lowered when
+    the move is too short to brake from it to the exit speed, and the
+    exit speed when it's too short to accelerate to it.
+    '''
+    def __init__(self, max_speed, acceleration, entry_speed, exit_speed):
+        if max_speed <= 0 or acceleration <= 0:
+            raise ValueError('max_speed and acceleration must be positive')
+        entry_speed = min(max(entry_speed, 0), max_speed)
+        exit_speed = min(max(exit_speed, 0), max_speed)
+        super(Blend, self).__init__(max_speed, acceleration, entry_speed,
+            exit_speed)
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.entry_speed = entry_speed
+        self.exit_speed = exit_speed
+
+    def _times(self, steps):
+        v0, v1, a = self.entry_speed, self.exit_speed, self.acceleration
+        if steps == 0:
+            return [0]
+        # the move may be too short to brake from the entry speed or to
+        # accelerate to the exit speed
+        v0 = min(v0, sqrt(v1*v1 + 2*a*steps))
+        v1 = min(v1, sqrt(v0*v0 + 2*a*steps))
+        peak = min(self.max_speed, sqrt((2*a*steps + v0*v0 + v1*v1)/2))
+        peak = max(peak, v0, v1)
+        up = (peak*peak - v0*v0)/(2*a)
+        down = (peak*peak - v1*v1)/(2*a)
+        cruise = (steps - up - down)/peak if peak else 0
+        total = (peak - v0)/a + max(cruise, 0) + (peak - v1)/a
+        times = []
+        for x in range(steps + 1):
+            if x <= up:
+                t = (sqrt(v0*v0 + 2*a*x) - v0)/a
+            elif x < steps - down:
+                t = (peak - v0)/a + (x - up)/peak
+            else:
+                t = total - (sqrt(v1*v1 + 2*a*(steps - x)) - v1)/a
+            times.append(int(t*NS))
+        return times
+
+#______________________________________________________________________
+# functions
+@lru_cache(maxsize=CACHE_SIZE)
+def schedule(profile, steps):
+    '''
+    Cached schedule of a move of 'steps' (positive) steps with 'profile'
+    '''
+    return tuple(profile._times(steps))
@@ -23,6 +23,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import cmd
 from time import sleep
 import RPistepper as stp
+from RPistepper import compiler
 from collections import OrderedDict
 
 #______________________________________________________________________
@@ -150,11 +151,25 @@ class Shell(cmd.Cmd, object):
             repeat = Repeat()
             repeat.prompt = self.prompt[:-1]+'repeat: '
             repeat.cmdloop()
-            for i in range(int(args[0])):
-                for command in repeat.commands:
-                    if self.onecmd(command) is False:
-                        print('Incorrect commands, aborting loop')
-                        return False
+            block = self._parse_block(repeat.commands)
+            for method, arg in self._iterate_block(block, int(args[0])):
+                if method(arg) is False:
+                    print('Incorrect commands, aborting loop')
+                    return False
+
+    def do_run(self, line):
+        args = line.split()
+        if not self._number_of_arguments(args, 1):
+            return False
+        try:
+            with open(args[0]) as script:
+                plan = compiler.compile_script(script, self.PINS, self.motors)
+        except (IOError, compiler.CompileError) as error:
+            print('Can\'t run {0}: {1}'.format(args[0], error))
+            return False
+        print('Running {0}, predicted runtime: {1:.2f} seconds'.format(
+            args[0], plan.duration()))
+        plan.run(self.motors, verbose=True)
 
     def do_done(self, line):
         pass
@@ -202,6 +217,9 @@ class Shell(cmd.Cmd, object):
     def help_repeat(self):
         print('Repeats the commands listed, the repeat block ends when the \'done\' command is called.\n Usage: repeat <number of repetitions>')
 
+    def help_run(self):
+        print('Compiles a script file and runs it. The whole script is validated before any motor moves.\n Usage: run <file>')
+
     def help_done(self):
         print('Concludes a repeat block.')
 
@@ -289,6 +307,34 @@ class Shell(cmd.Cmd, object):
             print('Please sepcify at least one motor to {0}'.format(method))
             return False
 
+    def _parse_block(self, commands):
+        '''
+        Parses the commands of a repeat block once, returns a list of
+        (method, argument) and (count, block) for the nested blocks
+        '''
+        block = []
+        for command in commands:
+            if isinstance(command, tuple):
+                count, nested = command
+                block.append((count, self._parse_block(nested)))
+            else:
+                name, arg, line = self.parseline(command)
+                block.append((getattr(self, 'do_'+name), arg))
+        return block
+
+    def _iterate_block(self, block, count):
+        '''
+        Lazily yields the (method, argument) of 'count' repetitions of
+        a parsed block, nested blocks are expanded as they are reached
+        '''
+        for i in range(count):
+            for first, second in block:
+                if callable(first):
+                    yield first, second
+                else:
+                    for command in self._iterate_block(second, first):
+                        yield command
+
     def _avaliable_ports(self, zero=False):
         if len(self.motors) <= 0 and zero:
             print('No motors listed')
@@ -299,7 +345,10 @@ class Shell(cmd.Cmd, object):
         return True
 
 class Repeat(Shell):
-    '''Repeat Interpreter Class for RPiStepper-Shell'''
+    '''
+    Repeat Interpreter Class for RPiStepper-Shell. The commands are
+    stored in self.commands, nested blocks as tuples (count, commands)
+    '''
 
     intro = ''
 
@@ -352,13 +401,17 @@ class Repeat(Shell):
     def do_sleep(self, line):
         pass
 
+    @_add_command
+    def do_run(self, line):
+        pass
+
     def do_repeat(self, line):
         args = line.split()
         if self._number_of_arguments(args, 1) and self._integer_arguments(args):
             repeat_nested = Repeat()
             repeat_nested.prompt = self.prompt[:-1]+'repeat: '
             repeat_nested.cmdloop()
-            self.commands += int(args[0])*(repeat_nested.commands)
+            self.commands.append((int(args[0]), repeat_nested.commands))
 
     def do_abort(self, line):
         self.commands = []
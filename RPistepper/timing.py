@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper timing strategies
+
+A timer tells the time in integer nanoseconds and blocks until an
+absolute deadline. The Motor class uses a timer to fire each step at its
+deadline:
+    * SleepTimer only sleeps, it's cheap but limited by the OS
+      scheduler (usually ~0.1-1ms of jitter on Linux).
+    * HybridTimer sleeps coarsely and then busy-waits the last 'spin'
+      seconds before the deadline, holding sub-millisecond periods at
+      the cost of some CPU.
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from time import sleep, perf_counter_ns
+
+#______________________________________________________________________
+# globals
+NS = 1000000000
+
+#______________________________________________________________________
+# classes
+class SleepTimer(object):
+    '''
+    Pure sleep timer. Sleeps until the deadline and returns
+    '''
+    def __repr__(self):
+        return '{0}()'.format(type(self).__name__)
+
+    def now(self):
+        '''
+        Current time in nanoseconds
+        '''
+        return perf_counter_ns()
+
+    def wait_until(self, deadline):
+        '''
+        Blocks until 'deadline' (nanoseconds). Returns the time of
+        wake up, which is never earlier than the deadline
+        '''
+        now = perf_counter_ns()
+        while now < deadline:
+            sleep((deadline - now)/NS)
+            now = perf_counter_ns()
+        return now
+
+class HybridTimer(SleepTimer):
+    '''
+    Sleeps until 'spin' seconds before the deadline and busy-waits the
+    rest of the way. 'spin' should be slightly larger than the sleep
+    overshoot of the system (default = 0.5ms).
+    '''
+    SPIN = 0.0005
+
+    def __init__(self, spin=SPIN):
+        self.spin = spin
+
+    def __repr__(self):
+        return '{0}(spin={1})'.format(type(self).__name__, self.spin)
+
+    @property
+    def spin(self):
+        '''
+        Busy-wait threshold in seconds
+        '''
+        return self._spin/NS
+
+    @spin.setter
+    def spin(self, value):
+        if value < 0:
+            raise ValueError('spin threshold must be positive')
+        self._spin = int(value*NS)
+
+    def wait_until(self, deadline):
+        '''
+        Blocks until 'deadline' (nanoseconds). Returns the time of
+        wake up, which is never earlier than the deadline
+        '''
+        now = perf_counter_ns()
+        coarse = deadline - self._spin
+        if now < coarse:
+            sleep((coarse - now)/NS)
+            now = perf_counter_ns()
+        while now < deadline:
+            now = perf_counter_ns()
+        return now
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper trajectories
+
+A trajectory is a generator of waypoints. Each waypoint is a tuple with
+the target position in steps of each axis, e.g. (x, y). Consecutive
+waypoints that change a single axis are plain single motor moves, the
+others are straight lines for a MotorGroup. Waypoints are computed as
+they are consumed, so a trajectory is never materialised and a raster
+of millions of lines runs in constant memory.
+
+Trajectories can be previewed with list() or itertools.islice and
+combined with itertools.chain. order() sorts an unordered set of
+target positions to cut the travel time between them. follow() runs a trajectory on a
+MotorGroup, either directly or streamed through an Executor:
+    group = MotorGroup([motor_x, motor_y])
+    follow(group, raster(2000, 1000, 10))
+    with Executor() as executor:
+        follow(group, circle(500), executor=executor)
+
+Copyright (C) 2015 Luiz Eduardo Amaral <luizamaral306@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+#______________________________________________________________________
+# imports
+from math import cos, sin, pi
+from collections import deque, namedtuple
+from .profiles import Constant
+
+#______________________________________________________________________
+# globals
+WINDOW = 16
+DELAY = 0.02  # Motor.DELAY
+PASSES = 20
+
+Ordering = namedtuple('Ordering',
+    ['points', 'seconds', 'original_seconds', 'saved'])
+
+#______________________________________________________________________
+# trajectories
+def zig_zag(amp1, amp2):
+    '''
+    Zig-zag from the origin. amp1 and amp2 are tuples (step, rep) of
+    the axes: axis 2 sweeps step2*rep2 steps forth and back while axis
+    1 advances step1 steps after each sweep, rep1 times
+    '''
+    step1, rep1 = amp1
+    step2, rep2 = amp2
+    sweep = step2*rep2
+    x = 0
+    for i in range(rep1):
+        yield (x, sweep)
+        x += step1
+        yield (x, sweep)
+        yield (x, 0)
+        x += step1
+        yield (x, 0)
+
+def square_spiral(amplitude):
+    '''
+    Square spiral around the origin. amplitude is a tuple (step, rep),
+    each of the 'rep' turns grows the square 'step' steps
+    '''
+    step, rep = amplitude
+    for i in range(1, rep + 1):
+        side = i*step
+        yield (step - side, side)
+        yield (side, side)
+        yield (-side, side)
+        yield (-side, -side)
+
+def raster(width, height, pitch, serpentine=True):
+    '''
+    Raster scan of a 'width' by 'height' steps rectangle from the
+    origin, lines along the first axis spaced 'pitch' steps. Lines
+    alternate direction when 'serpentine' is set, otherwise each line
+    starts from 0
+    '''
+    if pitch <= 0:
+        raise ValueError('pitch must be positive')
+    for n, y in enumerate(range(0, height + 1, pitch)):
+        start, end = (width, 0) if serpentine and n%2 else (0, width)
+        yield (start, y)
+        yield (end, y)
+
+def circle(radius, segments=None, center=(0, 0), start=0):
+    '''
+    Closed polygon approximating a circle of 'radius' steps around
+    'center', starting at the angle 'start' (radians). 'segments'
+    defaults to about one segment per 4 steps of the perimeter
+    '''
+    if segments is None:
+        segments = min(max(8, int(2*pi*radius/4)), 720)
+    cx, cy = center
+    for n in range(segments + 1):
+        angle = start + 2*pi*n/segments
+        yield (int(round(cx + radius*cos(angle))),
+            int(round(cy + radius*sin(angle))))
+
+def polyline(points, closed=False):
+    '''
+    Waypoints along an iterable of points, rounded to whole steps.
+    Repeated points are skipped. 'closed' returns to the first point
+    '''
+    previous = first = None
+    for point in points:
+        point = tuple(int(round(value)) for value in point)
+        if first is None:
+            first = point
+        if point != previous:
+            yield point
+        previous = point
+    if closed and first is not None and previous != first:
+        yield first
+
+#______________________________________________________________________
+# functions
+def follow(group, waypoints, profile=None, origin=None, executor=None,
+        window=WINDOW):
+    '''
+    Moves the MotorGroup 'group' through the waypoints with move_to.
+    'origin' offsets the waypoints, it defaults to the origin of the
+    motors. With an Executor the moves are queued, at most 'window' at
+    a time, so the waypoints are still consumed as the motors move.
+    Returns the number of waypoints
+    '''
+    count = 0
+    pending = deque()
+    for point in waypoints:
+        if origin is not None:
+            point = [value + offset for value, offset in zip(point, origin)]
+        if executor is None:
+            group.move_to(point, profile)
+        else:
+            if len(pending) >= window:
+                pending.popleft().result()
+            pending.append(executor.submit(group, 'move_to', point, profile))
+        count += 1
+    for future in pending:
+        future.result()
+    return count
+
+def order(points, start=None, profile=None, parallel=True, passes=PASSES):
+    '''
+    Orders the target positions 'points' (tuples of steps) to minimise
+    the travel time from 'start' (default = the origin) through all of
+    them, with a nearest neighbour tour improved by 2-opt. 'parallel'
+    axes move together, as with a MotorGroup, so a move takes as long
+    as its longest axis (Chebyshev distance); otherwise the axes move
+    one after the other, as with Motor.steps, and their times add up
+    (Manhattan distance). Moves are timed with 'profile', default =
+    constant Motor.DELAY. Returns an Ordering with the ordered points,
+    the predicted seconds of the ordered and original tours and the
+    seconds saved
+    '''
+    points = [tuple(point) for point in points]
+    if not points:
+        return Ordering([], 0, 0, 0)
+    if start is None:
+        start = (0,)*len(points[0])
+    if profile is None:
+        profile = Constant(DELAY)
+    nodes = [tuple(start)] + points
+    durations = {0: 0}
+
+    def duration(steps):
+        try:
+            return durations[steps]
+        except KeyError:
+            durations[steps] = profile.duration(steps)
+            return durations[steps]
+
+    def cost(a, b):
+        if parallel:
+            return duration(max(abs(x - y) for x, y in zip(a, b)))
+        return sum(duration(abs(x - y)) for x, y in zip(a, b))
+
+    table = [[cost(a, b) for b in nodes] for a in nodes]
+    original = sum(table[n][n + 1] for n in range(len(points)))
+    tour = _nearest_neighbour(table)
+    _two_opt(tour, table, passes)
+    seconds = sum(table[a][b] for a, b in zip(tour, tour[1:]))
+    if seconds >= original:
+        tour, seconds = list(range(len(nodes))), original
+    return Ordering([nodes[n] for n in tour[1:]], seconds, original,
+        original - seconds)
+
+def _nearest_neighbour(table):
+    '''
+    Tour of the node indexes from node 0, always visiting the nearest
+    unvisited node next
+    '''
+    unvisited = set(range(1, len(table)))
+    tour = [0]
+    while unvisited:
+        row = table[tour[-1]]
+        nearest = min(unvisited, key=row.__getitem__)
+        unvisited.remove(nearest)
+        tour.append(nearest)
+    return tour
+
+def _two_opt(tour, table, passes):
+    '''
+    Improves an open tour in place by reversing the stretches that
+    shorten it, the first node is kept
+    '''
+    last = len(tour) - 1
+    for n in range(passes):
+        improved = False
+        for i in range(1, last):
+            a, b = tour[i - 1], tour[i]
+            for j in range(i + 1, last + 1):
+                c = tour[j]
+                change = table[a][c] - table[a][b]
+                if j < last:
+                    d = tour[j + 1]
+                    change += table[b][d] - table[c][d]
+                if change < -1e-12:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    b = tour[i]
+                    improved = True
+        if not improved:
+            break
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper import time benchmark
+
+Measures the time to start a fresh interpreter and import each entry
+point of the package, and checks that the headless entry points don't
+load tkinter or RPi.GPIO. Prints the results as JSON:
+    python benchmarks/import_time.py [repetitions]
+'''
+#______________________________________________________________________
+# imports
+import os
+import sys
+import json
+import subprocess
+from time import perf_counter
+
+#______________________________________________________________________
+# globals
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPETITIONS = 10
+
+TARGETS = [
+    ('python', ''),
+    ('RPistepper', 'import RPistepper'),
+    ('RPistepper.compiler', 'import RPistepper.compiler'),
+    ('RPistepper.shell', 'import RPistepper.shell'),
+]
+
+CHECK = '; import sys; print(" ".join(m for m in ("tkinter", "Tkinter", "RPi.GPIO", "asyncio") if m in sys.modules))'
+
+#______________________________________________________________________
+# functions
+def measure(statement, repetitions=REPETITIONS):
+    '''
+    Runs 'statement' in fresh interpreters, returns a dict with the
+    minimum and median wall time in milliseconds
+    '''
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    command = [sys.executable, '-c', statement or 'pass']
+    # warm up the bytecode cache
+    subprocess.check_call(command, env=env)
+    times = []
+    for i in range(repetitions):
+        start = perf_counter()
+        subprocess.check_call(command, env=env)
+        times.append((perf_counter() - start)*1000)
+    times.sort()
+    loaded = subprocess.check_output(
+        [sys.executable, '-c', (statement or 'pass') + CHECK],
+        env=env, universal_newlines=True).split()
+    return {
+        'min_ms': round(times[0], 3),
+        'median_ms': round(times[len(times)//2], 3),
+        'loaded': loaded,
+    }
+
+def run(repetitions=REPETITIONS):
+    '''
+    Measures all targets, the time of the bare interpreter is
+    subtracted in 'import_ms'
+    '''
+    results = {}
+    for name, statement in TARGETS:
+        results[name] = measure(statement, repetitions)
+    base = results['python']['min_ms']
+    for name, result in results.items():
+        result['import_ms'] = round(result['min_ms'] - base, 3)
+    return results
+
+#______________________________________________________________________
+# main
+if __name__ == '__main__':
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else REPETITIONS
+    print(json.dumps(run(repetitions), indent=2, sort_keys=True))
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper benchmark suite
+
+Runs the stepping hot path against the simulated backend and against
+RPiGPIOBackend with a fake RPi.GPIO module, so it runs on any Linux
+box. Measures:
+    * throughput: steps per second of Motor.move with no delay
+    * jitter: step lateness percentiles at target step rates
+    * group: time per tick of a MotorGroup move with 1 to 7 motors
+    * shell: shell commands dispatched per second
+    * import: import time of the package (see import_time.py)
+Prints the results as JSON, or writes them to a file to compare
+releases:
+    python benchmarks/suite.py [--quick] [--output results.json]
+'''
+#______________________________________________________________________
+# imports
+import os
+import sys
+import json
+import types
+import argparse
+import platform
+from io import StringIO
+from time import perf_counter
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import RPistepper as stp
+from RPistepper import shell
+from RPistepper.instrument import StepRecorder
+from collections import OrderedDict
+import import_time
+
+#______________________________________________________________________
+# globals
+PINS = [stp.m0, stp.m1, stp.m2, stp.m3, stp.m4, stp.m5, stp.m6]
+STEPS = 100000
+RATES = (500, 1000, 2000, 5000)
+JITTER_STEPS = 2000
+COMMANDS = 20000
+
+#______________________________________________________________________
+# fake GPIO
+def fake_gpio():
+    '''
+    Installs a do-nothing RPi.GPIO module, unless the real one is
+    available
+    '''
+    try:
+        import RPi.GPIO
+        return False
+    except ImportError:
+        pass
+    GPIO = types.ModuleType('RPi.GPIO')
+    GPIO.BCM = 11
+    GPIO.OUT = 0
+    GPIO.setmode = lambda mode: None
+    GPIO.setup = lambda pins, mode: None
+    GPIO.output = lambda pins, states: None
+    GPIO.cleanup = lambda pins=None: None
+    RPi = types.ModuleType('RPi')
+    RPi.GPIO = GPIO
+    sys.modules['RPi'] = RPi
+    sys.modules['RPi.GPIO'] = GPIO
+    return True
+
+def backends():
+    '''
+    Returns a dict {name: backend} of the backends to benchmark
+    '''
+    return OrderedDict([
+        ('sim', stp.SimulatedBackend(record=False)),
+        ('rpi', stp.RPiGPIOBackend()),
+    ])
+
+#______________________________________________________________________
+# benchmarks
+def throughput(backend, steps=STEPS):
+    '''
+    Steps per second of a single motor moving with no delay
+    '''
+    motor = stp.Motor(stp.m0, delay=0, backend=backend)
+    motor.move(1000)
+    start = perf_counter()
+    motor.move(steps)
+    motor.move(-steps)
+    elapsed = perf_counter() - start
+    motor.cleanup()
+    return {
+        'steps_per_second': round(2*steps/elapsed),
+        'ns_per_step': round(elapsed/(2*steps)*1e9),
+    }
+
+def jitter(backend, rates=RATES, steps=JITTER_STEPS):
+    '''
+    Lateness percentiles in microseconds and missed deadlines of a
+    single motor at each target step rate
+    '''
+    motor = stp.Motor(stp.m0, backend=backend)
+    recorder = motor.recorder = StepRecorder(steps)
+    results = OrderedDict()
+    for rate in rates:
+        motor.DELAY = 1.0/rate
+        recorder.reset()
+        motor.move(steps)
+        results[str(rate)] = {
+            'rate': round(recorder.rate(), 1),
+            'missed': recorder.missed,
+            'jitter_us': dict((str(percentile), round(value*1e6, 3))
+                for percentile, value in recorder.jitter().items()),
+        }
+    motor.cleanup()
+    return results
+
+def group(backend, steps=STEPS//10):
+    '''
+    Time per tick of a group move with no delay, for 1 to 7 motors
+    '''
+    results = OrderedDict()
+    for count in range(1, len(PINS) + 1):
+        motors = [stp.Motor(pins, delay=0, backend=backend)
+            for pins in PINS[:count]]
+        motor_group = stp.MotorGroup(motors)
+        motor_group.move([100]*count)
+        start = perf_counter()
+        motor_group.move([steps]*count)
+        motor_group.move([-steps]*count)
+        elapsed = perf_counter() - start
+        motor_group.cleanup()
+        results[str(count)] = {
+            'ns_per_tick': round(elapsed/(2*steps)*1e9),
+            'ns_per_motor_step': round(elapsed/(2*steps*count)*1e9),
+        }
+    return results
+
+def dispatch(commands=COMMANDS):
+    '''
+    Shell commands dispatched per second, the motors step with no delay
+    so the parsing and dispatch dominate
+    '''
+    interpreter = shell.Shell()
+    interpreter.motors = OrderedDict()
+    script = ['move m0 1', 'move m1 -1', 'lock m0', 'release m1']
+    with redirect_stdout(StringIO()):
+        interpreter.onecmd('new m0 m1')
+        for motor in interpreter.motors.values():
+            motor.DELAY = 0
+        start = perf_counter()
+        for i in range(commands//len(script)):
+            for line in script:
+                interpreter.onecmd(line)
+        elapsed = perf_counter() - start
+        block = interpreter._parse_block(script)
+        start = perf_counter()
+        for method, arg in interpreter._iterate_block(
+                block, commands//len(script)):
+            method(arg)
+        repeat = perf_counter() - start
+        interpreter.cleanup()
+    return {
+        'onecmd_per_second': round(commands/elapsed),
+        'repeat_per_second': round(commands/repeat),
+    }
+
+def run(quick=False):
+    '''
+    Runs every benchmark, 'quick' cuts the work tenfold
+    '''
+    scale = 10 if quick else 1
+    results = OrderedDict()
+    results['platform'] = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'fake_gpio': fake_gpio(),
+    }
+    for name, backend in backends().items():
+        stp.set_backend(backend)
+        results[name] = OrderedDict([
+            ('throughput', throughput(backend, STEPS//scale)),
+            ('jitter', jitter(backend, steps=JITTER_STEPS//scale)),
+            ('group', group(backend, STEPS//10//scale)),
+        ])
+    stp.set_backend(stp.SimulatedBackend(record=False))
+    results['shell'] = dispatch(COMMANDS//scale)
+    results['import'] = import_time.run(3 if quick else import_time.REPETITIONS)
+    return results
+
+#______________________________________________________________________
+# main
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RPistepper benchmarks')
+    parser.add_argument('-q', '--quick', action='store_true',
+        help='smaller runs, for a quick check')
+    parser.add_argument('-o', '--output', help='write the JSON results to a file')
+    args = parser.parse_args()
+    results = json.dumps(run(args.quick), indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(results + '\n')
+    else:
+        print(results)
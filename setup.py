@@ -15,16 +15,14 @@ setup(
         'Topic :: System :: Hardware',
         'Topic :: Software Development :: Libraries :: Python Modules',
         'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
     ],
     keywords='RPi ULN2803A stepper motor',
+    python_requires='>=3.7',
     packages=find_packages(exclude=['RPi']),
     scripts=['bin/rpistepper'],
     install_requires=['RPi.GPIO>=0.5.8'],
+    extras_require={'planner': ['numpy']},
 )
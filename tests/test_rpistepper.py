@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+RPistepper tests, run with pytest. The motors run on a SimulatedBackend
+'''
+#______________________________________________________________________
+# imports
+import threading
+import RPistepper as stp
+from RPistepper.backends import SimulatedBackend
+from RPistepper.compiler import compile_script
+from RPistepper.executor import Executor, _direction
+from RPistepper.gcode import Interpreter
+
+#______________________________________________________________________
+# helpers
+class StopWhileScheduling(stp.Constant):
+    '''
+    Constant profile that calls 'stop' while the move is scheduled
+    '''
+    def __init__(self, delay, stop):
+        super(StopWhileScheduling, self).__init__(delay)
+        self.stop = stop
+
+    def schedule(self, steps):
+        self.stop()
+        return super(StopWhileScheduling, self).schedule(steps)
+
+class Index(object):
+    '''
+    An integer that is not an int
+    '''
+    def __init__(self, value):
+        self.value = value
+
+    def __index__(self):
+        return self.value
+
+def motor(pins=stp.m0, backend=None, **kwargs):
+    return stp.Motor(pins, backend=backend or SimulatedBackend(record=False),
+        **kwargs)
+
+def coils(backend, pins):
+    return [backend.state[pin] for pin in pins]
+
+#______________________________________________________________________
+# step timing
+def test_hybrid_timer_move():
+    m = motor(timer=stp.HybridTimer())
+    m.recorder = stp.StepRecorder()
+    report = m.move(400, stp.Constant(0.001))
+    jitter = m.recorder.jitter(50, 99)
+    assert report.steps == 400
+    assert m.recorder.count == 400
+    # generous bounds, the tests may run on a loaded machine
+    assert m.recorder.missed < 40
+    assert report.late == m.recorder.missed
+    assert 0 <= jitter[50] < 0.0005
+    assert jitter[50] <= jitter[99]
+
+#______________________________________________________________________
+# peephole optimizer
+def test_optimized_plan_matches():
+    script = ['new m0', 'move m0 30', 'move m0 20', 'sleep 10', 'move m0 -5',
+        'release m0', 'reset m0', 'lock m0', 'release m0', 'reset m0',
+        'lock m0']
+    states = []
+    for optimize in (False, True):
+        backend = SimulatedBackend(record=False)
+        motors = {}
+        compile_script(script, optimize=optimize).run(motors, backend)
+        states.append((motors['m0'].steps, motors['m0'].locked,
+            coils(backend, stp.m0)))
+    assert states[0] == states[1]
+    assert states[1][1] and any(states[1][2])
+
+#______________________________________________________________________
+# stops
+def test_stop_while_scheduling():
+    m = motor()
+    report = m.move(100, StopWhileScheduling(0.0001, lambda: m.stop(True)))
+    assert report.steps == 0
+    assert m.steps == 0
+    assert m.last_stop.hard
+    # the stop doesn't leak into the next move
+    assert m.move(10, stp.Constant(0.0001)).steps == 10
+
+def test_executor_stop_while_scheduling():
+    m = motor()
+    with Executor() as executor:
+        profile = StopWhileScheduling(0.0001,
+            lambda: executor.stop(hard=True))
+        report = executor.move(m, 100, profile).result(5)
+        assert report.steps == 0
+        assert m.steps == 0
+        assert executor.move(m, 10, stp.Constant(0.0001)).result(5).steps == 10
+    assert m.steps == 10
+
+def test_blend_soft_stop():
+    backend = SimulatedBackend(record=False)
+    group = stp.MotorGroup([motor(stp.m0, backend), motor(stp.m1, backend)])
+    timer = threading.Timer(0.1, group.stop)
+    timer.start()
+    report = group.move([400, 200], stp.Blend(1000, 4000, 1000, 1000))
+    timer.join()
+    assert 0 < group.last_stop.decel_steps <= 125
+    assert report.steps < 400
+    assert group.steps[0] == report.steps
+
+#______________________________________________________________________
+# executor
+def test_direction():
+    assert _direction(Index(5)) is True
+    assert _direction(Index(-5)) is False
+    assert _direction([3, 0, -2]) == (1, 0, -1)
+
+def test_failed_chain_key():
+    m = motor()
+    release = threading.Event()
+    def move(steps, profile=None, start=None):
+        release.wait(5)
+        return stp.MoveStats(0, 0, 0, 0, 0, 0, 0)
+    m.move = move
+    with Executor() as executor:
+        # the chain key of these steps raises TypeError
+        bad = executor.move(m, object())
+        good = executor.move(m, 1)
+        release.set()
+        assert isinstance(bad.exception(5), TypeError)
+        assert good.result(5).steps == 0
+        assert executor.wait_idle(5)
+
+#______________________________________________________________________
+# profiles
+def test_blend_entry_clamp():
+    offsets = stp.Blend(100, 100, 100, 0).schedule(5)
+    # the entry is clamped to what 5 steps can brake from
+    assert offsets[1]/stp.NS < 0.05
+
+#______________________________________________________________________
+# g-code
+def test_gcode_units_before_feed():
+    interpreter = Interpreter({'X': motor()}, {'X': 1})
+    interpreter.execute('G20 G1 F10')
+    assert abs(interpreter.feed_rate - 254) < 1e-9
+
+#______________________________________________________________________
+# bank
+def test_bank_pending_per_thread():
+    bank = stp.Bank(SimulatedBackend(record=False))
+    m0 = motor(stp.m0, bank.backend, bank=bank)
+    m1 = motor(stp.m1, bank.backend, bank=bank)
+    with bank:
+        m0.lock()
+        thread = threading.Thread(target=m1.lock)
+        thread.start()
+        thread.join()
+        # the other thread isn't deferred by this one
+        assert any(coils(bank.backend, stp.m1))
+        assert not any(coils(bank.backend, stp.m0))
+    assert any(coils(bank.backend, stp.m0))